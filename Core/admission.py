@@ -0,0 +1,150 @@
+import time
+import logging
+from contextlib import contextmanager
+
+from Core.cache import CacheBackend, get_cache
+from Core.utils import load_config
+
+logger = logging.getLogger(__name__)
+
+# Degradation ladder, from cheapest to most drastic:
+#   ELEVATED   -> skip title generation, shed voice requests
+#   OVERLOADED -> answer locally (keyword analyzer, breathing exercise) instead of calling Gemini
+# Crisis messages bypass admission entirely and are never shed.
+NORMAL = 0
+ELEVATED = 1
+OVERLOADED = 2
+
+DEFAULT_ADMISSION = {
+    'max_in_flight': 8,
+    'max_in_flight_per_user': 2,
+    'max_queue': 16,
+    'queue_timeout_seconds': 5,
+    'upstream_timeout_seconds': 20,
+    'voice_max_in_flight': 1,
+    'voice_lease_seconds': 180,
+    'failure_threshold': 3,
+    'cooldown_seconds': 30,
+}
+
+
+class AdmissionController:
+    """Bounds concurrent upstream work across every worker and tracks upstream health.
+
+    Slots are leases in the shared cache (Core/cache.py): a request takes one
+    with `add` and hands it back with `delete`, and a lease left behind by a
+    killed worker expires on its own. With the in-process cache backend every
+    worker has its own slots, so set REDIS_URL when running several workers.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_in_flight_per_user: int = 2, max_queue: int = 16,
+                 queue_timeout_seconds: float = 5, upstream_timeout_seconds: float = 20,
+                 voice_max_in_flight: int = 1, voice_lease_seconds: float = 180, failure_threshold: int = 3,
+                 cooldown_seconds: float = 30, cache: CacheBackend | None = None, **_):
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_user = max_in_flight_per_user
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.voice_max_in_flight = voice_max_in_flight
+        self.voice_lease_seconds = voice_lease_seconds
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+        self.cache = cache if cache is not None else get_cache('admission')
+        # Long enough for one upstream call plus local work, so live leases never lapse
+        self.lease_seconds = 2 * upstream_timeout_seconds
+        self.poll_interval = 0.05
+
+    def _take(self, pool: str, size: int, ttl: float) -> str | None:
+        for index in range(size):
+            key = f"{pool}:{index}"
+            if self.cache.add(key, 1, ttl=ttl):
+                return key
+        return None
+
+    def _count(self, pool: str, size: int) -> int:
+        return sum(value is not None for value in self.cache.get_many([f"{pool}:{index}" for index in range(size)]))
+
+    def upstream_available(self) -> bool:
+        return self.cache.get('upstream_down') is None
+
+    def pressure(self) -> int:
+        if not self.upstream_available():
+            return OVERLOADED
+        waiting = self._count('queue', self.max_queue)
+        if waiting >= self.max_queue:
+            return OVERLOADED
+        if waiting > 0 or self._count('slot', self.max_in_flight) >= self.max_in_flight:
+            return ELEVATED
+        return NORMAL
+
+    @contextmanager
+    def admit(self, user_id: str):
+        """Wait (up to the queue deadline) for an upstream slot. Yields whether the request was admitted."""
+        leases = self._acquire(user_id)
+        try:
+            yield leases is not None
+        finally:
+            for key in leases or ():
+                self.cache.delete(key)
+
+    def _acquire(self, user_id: str) -> list | None:
+        user_lease = self._take(f"user:{user_id}", self.max_in_flight_per_user, self.lease_seconds)
+        if user_lease is None:
+            logger.warning(f"Admission refused: user '{user_id}' already has {self.max_in_flight_per_user} requests in flight")
+            return None
+
+        slot = self._take('slot', self.max_in_flight, self.lease_seconds)
+        if slot is None:
+            slot = self._wait_for_slot()
+        if slot is None:
+            self.cache.delete(user_lease)
+            return None
+        return [user_lease, slot]
+
+    def _wait_for_slot(self) -> str | None:
+        queue_lease = self._take('queue', self.max_queue, self.queue_timeout_seconds + self.lease_seconds)
+        if queue_lease is None:
+            logger.warning("Admission refused: request queue is full")
+            return None
+        try:
+            # Slots are released by other processes, so poll rather than wait on a condition
+            deadline = time.monotonic() + self.queue_timeout_seconds
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                slot = self._take('slot', self.max_in_flight, self.lease_seconds)
+                if slot is not None:
+                    return slot
+            logger.warning("Admission refused: queue deadline exceeded")
+            return None
+        finally:
+            self.cache.delete(queue_lease)
+
+    @contextmanager
+    def voice_slot(self):
+        """Non-blocking slot for transcription. Voice is the first thing shed under pressure."""
+        lease = None
+        if self.pressure() == NORMAL:
+            lease = self._take('voice', self.voice_max_in_flight, self.voice_lease_seconds)
+        try:
+            yield lease is not None
+        finally:
+            if lease is not None:
+                self.cache.delete(lease)
+
+    def record_upstream(self, ok: bool):
+        """Open the upstream circuit for `cooldown_seconds` after repeated failures."""
+        if ok:
+            self.cache.delete('failures')
+            return
+        failures = self.cache.incr('failures', ttl=self.cooldown_seconds)
+        if failures >= self.failure_threshold:
+            self.cache.set('upstream_down', True, ttl=self.cooldown_seconds)
+            self.cache.delete('failures')
+            logger.warning(f"Upstream failing; answering locally for {self.cooldown_seconds}s")
+
+
+def get_admission_config() -> dict:
+    admission_config = dict(DEFAULT_ADMISSION)
+    admission_config.update(load_config().get('admission', {}))
+    return admission_config
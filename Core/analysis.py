@@ -0,0 +1,284 @@
+"""Offline batch analysis over stored conversations and the mood log.
+
+Streams every conversation (hot shards and archives) and mood entry, fans
+user messages out to a process pool in chunks, and runs the chatbot's own
+crisis and keyword-sentiment checks on them. Writes a JSON report plus CSV
+tables, including per-stage throughput, to logs/analysis/<timestamp>/.
+
+  python -m Core.analysis --workers 4
+  python -m Core.analysis --candidate-keywords new_keywords.txt
+
+With --candidate-keywords, messages are also checked against the proposed
+crisis list and compared with the current one, so keyword changes can be
+validated against real traffic before they ship.
+"""
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+import statistics
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from multiprocessing import Pool
+
+from Core.keywords import CRISIS_KEYWORDS, keyword_sentiment, find_crisis_keywords, handle_crisis_message
+from Core.transfer import iter_records
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+LENGTH_BUCKETS = (2, 4, 8, 16, 32, 64, 128)
+
+_candidate_keywords = None
+
+
+def _init_worker(candidate_keywords):
+    global _candidate_keywords
+    _candidate_keywords = candidate_keywords
+
+
+def _empty_totals() -> dict:
+    return {
+        'messages': 0,
+        'characters': 0,
+        'sentiment': Counter(),
+        'crisis_flagged': 0,
+        'crisis_keywords': Counter(),
+        'candidate_flagged': 0,
+        'candidate_keywords': Counter(),
+        'flagged_by_both': 0,
+        'only_current': 0,
+        'only_candidate': 0,
+        'mood_entries': 0,
+        'logged_moods': Counter(),
+        'mood_message_sentiment': Counter(),
+        'seconds': 0.0,  # compute time spent in analyze_chunk, summed over chunks
+    }
+
+
+def analyze_chunk(chunk: list) -> dict:
+    """Analyze a list of ('message', text) / ('mood', entry) items. Runs in a worker process."""
+    started = time.perf_counter()
+    totals = _empty_totals()
+    for kind, item in chunk:
+        if kind == 'mood':
+            totals['mood_entries'] += 1
+            totals['logged_moods'][str(item.get('mood'))] += 1
+            if isinstance(item.get('message'), str) and item['message']:
+                totals['mood_message_sentiment'][keyword_sentiment(item['message'])] += 1
+            continue
+
+        totals['messages'] += 1
+        totals['characters'] += len(item)
+        totals['sentiment'][keyword_sentiment(item)] += 1
+
+        flagged = handle_crisis_message(item) is not None
+        if flagged:
+            totals['crisis_flagged'] += 1
+            totals['crisis_keywords'].update(find_crisis_keywords(item))
+
+        if _candidate_keywords is not None:
+            candidate_matches = find_crisis_keywords(item, _candidate_keywords)
+            candidate_flagged = bool(candidate_matches)
+            totals['candidate_flagged'] += candidate_flagged
+            totals['candidate_keywords'].update(candidate_matches)
+            totals['flagged_by_both'] += flagged and candidate_flagged
+            totals['only_current'] += flagged and not candidate_flagged
+            totals['only_candidate'] += candidate_flagged and not flagged
+    totals['seconds'] = time.perf_counter() - started
+    return totals
+
+
+def _merge(totals: dict, partial: dict):
+    for key, value in partial.items():
+        totals[key] += value
+
+
+def _length_histogram(lengths: list) -> list:
+    histogram = Counter()
+    for length in lengths:
+        bucket = next((f"<={bound}" for bound in LENGTH_BUCKETS if length <= bound), f">{LENGTH_BUCKETS[-1]}")
+        histogram[bucket] += 1
+    order = [f"<={bound}" for bound in LENGTH_BUCKETS] + [f">{LENGTH_BUCKETS[-1]}"]
+    return [(bucket, histogram[bucket]) for bucket in order]
+
+
+class _Stage:
+    """Accumulates time spent and item counts for one pipeline stage."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.items = 0
+
+    def report(self) -> dict:
+        return {
+            'items': self.items,
+            'seconds': round(self.seconds, 3),
+            'items_per_second': round(self.items / self.seconds, 1) if self.seconds else None,
+        }
+
+
+def _iter_work_items(lengths: list, read_stage: _Stage, malformed: Counter):
+    """Flatten stored records into analyzable items, timing the storage reads.
+
+    Stored history can come from clients, so turns and parts that are not the
+    expected dicts are counted in `malformed` and skipped.
+    """
+    records = iter_records()
+    while True:
+        started = time.perf_counter()
+        record = next(records, None)
+        read_stage.seconds += time.perf_counter() - started
+        if record is None:
+            return
+        read_stage.items += 1
+
+        if record['type'] == 'conversation':
+            history = record.get('history', [])
+            if not isinstance(history, list):
+                malformed['histories'] += 1
+                continue
+            lengths.append(len(history))
+            for turn in history:
+                if not isinstance(turn, dict) or not isinstance(turn.get('parts', []), list):
+                    malformed['turns'] += 1
+                    continue
+                if turn.get('role') == 'user':
+                    for part in turn.get('parts', []):
+                        if not isinstance(part, dict) or not isinstance(part.get('text', ''), str):
+                            malformed['parts'] += 1
+                        elif part.get('text'):
+                            yield ('message', part['text'])
+        elif record['type'] == 'mood':
+            yield ('mood', record)
+
+
+def _chunks(items, chunk_size: int):
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_analysis(workers: int | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 candidate_keywords: list | None = None, output_dir: str | None = None) -> dict:
+    started_at = time.perf_counter()
+    stages = {'read': _Stage(), 'analyze': _Stage(), 'write': _Stage()}
+    totals = _empty_totals()
+    lengths = []
+    malformed = Counter()
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(candidate_keywords,)) as pool:
+        chunks = _chunks(_iter_work_items(lengths, stages['read'], malformed), chunk_size)
+        for partial in pool.imap_unordered(analyze_chunk, chunks):
+            _merge(totals, partial)
+            stages['analyze'].items += partial['messages'] + partial['mood_entries']
+    # Reads overlap analysis, so each stage is timed where it runs: reads in
+    # _iter_work_items, analysis inside the workers (summed across them)
+    stages['analyze'].seconds = totals['seconds']
+
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'workers': workers or os.cpu_count(),
+        'chunk_size': chunk_size,
+        'conversations': {
+            'count': len(lengths),
+            'mean_turns': round(statistics.mean(lengths), 2) if lengths else 0,
+            'median_turns': statistics.median(lengths) if lengths else 0,
+            'max_turns': max(lengths, default=0),
+            'turn_histogram': dict(_length_histogram(lengths)),
+        },
+        'malformed': {key: malformed[key] for key in ('histories', 'turns', 'parts')},
+        'messages': {
+            'count': totals['messages'],
+            'mean_characters': round(totals['characters'] / totals['messages'], 1) if totals['messages'] else 0,
+            'sentiment': dict(totals['sentiment']),
+        },
+        'crisis': {
+            'keywords': len(CRISIS_KEYWORDS),
+            'flagged_messages': totals['crisis_flagged'],
+            'flagged_rate': round(totals['crisis_flagged'] / totals['messages'], 4) if totals['messages'] else 0,
+            'keyword_hits': dict(totals['crisis_keywords'].most_common()),
+        },
+        'moods': {
+            'entries': totals['mood_entries'],
+            'logged_moods': dict(totals['logged_moods']),
+            'message_sentiment': dict(totals['mood_message_sentiment']),
+        },
+    }
+    if candidate_keywords is not None:
+        flagged_by_current = totals['flagged_by_both'] + totals['only_current']
+        report['candidate_crisis'] = {
+            'keywords': len(candidate_keywords),
+            'flagged_messages': totals['candidate_flagged'],
+            'flagged_by_both': totals['flagged_by_both'],
+            'only_current': totals['only_current'],
+            'only_candidate': totals['only_candidate'],
+            # Share of currently flagged messages the candidate list still catches
+            'recall_vs_current': round(totals['flagged_by_both'] / flagged_by_current, 4) if flagged_by_current else None,
+            'keyword_hits': dict(totals['candidate_keywords'].most_common()),
+        }
+
+    output_dir = output_dir or os.path.join('logs', 'analysis', datetime.now().strftime('%Y%m%d-%H%M%S'))
+    write_started = time.perf_counter()
+    _write_report(report, totals, lengths, stages, output_dir)
+    stages['write'].seconds = time.perf_counter() - write_started
+    stages['write'].items = 1
+
+    report['throughput'] = {name: stage.report() for name, stage in stages.items()}
+    report['total_seconds'] = round(time.perf_counter() - started_at, 3)
+    # Rewrite the JSON report now that the write stage has been timed
+    with open(os.path.join(output_dir, 'report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    _write_csv(os.path.join(output_dir, 'throughput.csv'), ['stage', 'items', 'seconds', 'items_per_second'],
+               [[name, *stage.report().values()] for name, stage in stages.items()])
+
+    logger.info(f"Analysis written to {output_dir}")
+    return report
+
+
+def _write_csv(path: str, header: list, rows: list):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _write_report(report: dict, totals: dict, lengths: list, stages: dict, output_dir: str):
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+    _write_csv(os.path.join(output_dir, 'sentiment.csv'), ['source', 'sentiment', 'count'],
+               [['messages', sentiment, count] for sentiment, count in totals['sentiment'].items()] +
+               [['mood_messages', sentiment, count] for sentiment, count in totals['mood_message_sentiment'].items()])
+    keyword_rows = [['current', keyword, totals['crisis_keywords'][keyword]] for keyword in CRISIS_KEYWORDS]
+    keyword_rows += [['candidate', keyword, count] for keyword, count in totals['candidate_keywords'].most_common()]
+    _write_csv(os.path.join(output_dir, 'crisis_keywords.csv'), ['list', 'keyword', 'hits'], keyword_rows)
+    _write_csv(os.path.join(output_dir, 'conversation_lengths.csv'), ['turns', 'conversations'],
+               _length_histogram(lengths))
+
+
+def _load_keywords(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return [keyword.lower() for keyword in json.load(f)]
+        return [line.strip().lower() for line in f if line.strip() and not line.startswith('#')]
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Batch crisis/sentiment/length analysis over stored data.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Items per worker task.")
+    parser.add_argument('--candidate-keywords', default=None,
+                        help="Proposed crisis keyword list (one per line, or a JSON array) to compare.")
+    parser.add_argument('--output-dir', default=None, help="Where to write report.json and the CSV files.")
+    args = parser.parse_args()
+    candidate = _load_keywords(args.candidate_keywords) if args.candidate_keywords else None
+    result = run_analysis(args.workers, args.chunk_size, candidate, args.output_dir)
+    print(json.dumps(result['throughput'], indent=4))
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import re
+import logging
+
+import threading
+
+from Core.utils import FileLock, atomic_write
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Core/__init__.py creates this directory on import
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), '..', 'conversations')
+
+INDEX_EXTENSION = '.index.json'
+
+_EXTENSIONS = {
+    'zstd': '.json.zst',
+    'gzip': '.json.gz',
+}
+
+
+def _compression(preferred: str = 'gzip') -> str:
+    if preferred == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to gzip for archives.")
+        return 'gzip'
+    return preferred if preferred in _EXTENSIONS else 'gzip'
+
+
+def _safe_user_id(user_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9-]', '_', user_id)
+
+
+def split_conversation_key(conversation_name: str) -> tuple[str, str]:
+    """Split a stored '<user_id>_<name>' key into its user id and name."""
+    user_id, _, name = conversation_name.partition('_')
+    return user_id, name
+
+
+_archive_locks = {}
+_archive_locks_lock = threading.Lock()
+
+
+def archive_lock(user_id: str) -> FileLock:
+    """Cross-process lock for one user's archive; take it after any shard lock, never before."""
+    path = os.path.join(ARCHIVE_DIR, _safe_user_id(user_id) + '.lock')
+    with _archive_locks_lock:
+        if path not in _archive_locks:
+            _archive_locks[path] = FileLock(path)
+        return _archive_locks[path]
+
+
+def _index_path(user_id: str) -> str:
+    return os.path.join(ARCHIVE_DIR, _safe_user_id(user_id) + INDEX_EXTENSION)
+
+
+def archive_path(user_id: str) -> str | None:
+    """Return the existing archive file for a user, whatever its compression."""
+    for extension in _EXTENSIONS.values():
+        path = os.path.join(ARCHIVE_DIR, _safe_user_id(user_id) + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def compress(payload: bytes, compression: str = 'gzip') -> bytes:
+    if _compression(compression) == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(payload)
+    return gzip.compress(payload, compresslevel=9)
+
+
+def _decompress(path: str, raw: bytes) -> bytes:
+    if path.endswith(_EXTENSIONS['zstd']):
+        if zstandard is None:
+            raise RuntimeError(f"Archive '{path}' is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(raw)
+    return gzip.decompress(raw)
+
+
+class ArchiveError(Exception):
+    """An archive exists but cannot be decoded. It must never be overwritten."""
+
+
+def read_user_archive(user_id: str) -> dict:
+    path = archive_path(user_id)
+    if not path:
+        return {}
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        conversations = json.loads(_decompress(path, raw).decode('utf-8'))
+    except Exception as e:  # gzip raises OSError/EOFError, zstandard its own ZstdError
+        logger.error(f"Archive '{path}' is unreadable: {e!r}")
+        raise ArchiveError(f"Archive '{path}' is unreadable: {e!r}") from e
+    if not isinstance(conversations, dict):
+        raise ArchiveError(f"Archive '{path}' does not hold a conversation mapping")
+    return conversations
+
+
+def write_user_archive(user_id: str, conversations: dict, compression: str = 'gzip') -> int:
+    """Replace a user's archive with `conversations`. Returns the bytes written."""
+    old_path = archive_path(user_id)
+    if not conversations:
+        if old_path:
+            os.remove(old_path)
+        if os.path.exists(_index_path(user_id)):
+            os.remove(_index_path(user_id))
+        return 0
+
+    compression = _compression(compression)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, _safe_user_id(user_id) + _EXTENSIONS[compression])
+    data = compress(json.dumps(conversations, ensure_ascii=False).encode('utf-8'), compression)
+
+    # Write to a temporary file first so a crash never leaves a truncated archive
+    atomic_write(path, data)
+    _write_index(user_id, conversations)
+    if old_path and old_path != path:
+        os.remove(old_path)
+    return len(data)
+
+
+def _write_index(user_id: str, conversations: dict):
+    atomic_write(_index_path(user_id), json.dumps(sorted(conversations), ensure_ascii=False))
+
+
+def read_archive_names(user_id: str) -> list[str]:
+    """Stored keys of a user's archived conversations, without decompressing the archive."""
+    try:
+        with open(_index_path(user_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.warning(f"Archive index for '{user_id}' is unreadable, rebuilding it: {e}")
+    if not archive_path(user_id):
+        return []
+    with archive_lock(user_id):
+        try:
+            conversations = read_user_archive(user_id)
+        except ArchiveError:
+            return []
+        # Archives written before the index existed get one on first listing
+        if conversations:
+            _write_index(user_id, conversations)
+    return sorted(conversations)
@@ -0,0 +1,191 @@
+"""Static asset pipeline.
+
+`python -m Core.assets` copies every file in static/ to static/dist/ under a
+content-hashed name, converts GIF/PNG images to WebP when Pillow is installed
+and the result is smaller, rewrites url(...) references in CSS, writes gzip
+(and brotli, if installed) variants of text assets, and records everything in
+static/dist/manifest.json.
+
+Templates use `asset_url('app.css')`. Fingerprinted files are served from
+/assets/ with immutable cache headers; without a build, `asset_url` falls back
+to Flask's regular /static/ handler.
+"""
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import mimetypes
+
+from flask import request, send_from_directory, url_for
+
+try:
+    from PIL import Image
+except ImportError:  # WebP conversion is skipped without Pillow
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # only gzip variants are written without brotli
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Not registered by default on every platform
+mimetypes.add_type('image/webp', '.webp')
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), '..', 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+
+IMAGE_EXTENSIONS = ('.png', '.gif')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+# Tried in order of preference against the request's Accept-Encoding
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ONE_YEAR = 365 * 24 * 3600
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+
+
+def _fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _fingerprinted_name(name: str, data: bytes) -> str:
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{_fingerprint(data)}{extension}"
+
+
+def _to_webp(path: str) -> bytes | None:
+    """Lossless WebP keeps the pixel art crisp; animated GIFs stay animated."""
+    if Image is None:
+        return None
+    from io import BytesIO
+    try:
+        with Image.open(path) as image:
+            output = BytesIO()
+            animated = getattr(image, 'is_animated', False)
+            image.save(output, format='WEBP', lossless=True, method=6, save_all=animated)
+    except Exception as e:
+        logger.warning(f"WebP conversion failed for '{path}', keeping the original: {e}")
+        return None
+    return output.getvalue()
+
+
+def _rewrite_css_urls(css: str, manifest: dict) -> str:
+    def replace(match):
+        quote, target = match.groups()
+        if target in manifest:
+            return f"url({quote}{manifest[target]}{quote})"
+        return match.group(0)
+    return CSS_URL_PATTERN.sub(replace, css)
+
+
+def _write_variants(path: str, data: bytes) -> dict:
+    sizes = {}
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    sizes['gzip'] = os.path.getsize(path + '.gz')
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        sizes['br'] = os.path.getsize(path + '.br')
+    return sizes
+
+
+def build_assets() -> dict:
+    """Rebuild static/dist/ and its manifest. Returns the manifest."""
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    sources = sorted(
+        name for name in os.listdir(STATIC_DIR)
+        if os.path.isfile(os.path.join(STATIC_DIR, name))
+    )
+    # Images first so stylesheets can point at their final names
+    sources.sort(key=lambda name: name.endswith('.css'))
+
+    manifest = {}
+    report = []
+    for name in sources:
+        source_path = os.path.join(STATIC_DIR, name)
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        output_name = name
+
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            webp = _to_webp(source_path)
+            if webp is not None and len(webp) < len(data):
+                data = webp
+                output_name = os.path.splitext(name)[0] + '.webp'
+        elif name.endswith('.css'):
+            data = _rewrite_css_urls(data.decode('utf-8'), manifest).encode('utf-8')
+
+        hashed_name = _fingerprinted_name(output_name, data)
+        hashed_path = os.path.join(DIST_DIR, hashed_name)
+        with open(hashed_path, 'wb') as f:
+            f.write(data)
+        manifest[name] = hashed_name
+
+        variants = _write_variants(hashed_path, data) if name.endswith(COMPRESSIBLE_EXTENSIONS) else {}
+        report.append((name, os.path.getsize(source_path), len(data), variants))
+
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+
+    for name, source_size, output_size, variants in report:
+        compressed = ', '.join(f"{encoding} {size}" for encoding, size in variants.items())
+        logger.info(f"{name}: {source_size} -> {output_size} bytes" + (f" ({compressed})" if compressed else ""))
+    return manifest
+
+
+def load_manifest() -> dict:
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    logger.warning("No asset manifest found; serving unfingerprinted files. Run 'python -m Core.assets' to build it.")
+    return {}
+
+
+def init_app(app):
+    """Register the `asset_url` template helper and the /assets/ route on a Flask app."""
+    manifest = load_manifest()
+
+    def asset_url(name: str) -> str:
+        if name in manifest:
+            return url_for('serve_asset', filename=manifest[name])
+        return url_for('static', filename=name)
+
+    app.add_template_global(asset_url)
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        accepted = request.accept_encodings
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        # The fingerprint in the name already identifies the content
+        etag = os.path.splitext(filename)[0].rsplit('.', 1)[-1]
+
+        for encoding, suffix in ENCODINGS:
+            if accepted[encoding] and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+                response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype,
+                                               etag=f"{etag}-{encoding}", max_age=ONE_YEAR)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(DIST_DIR, filename, mimetype=mimetype, etag=etag, max_age=ONE_YEAR)
+
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    return asset_url
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    manifest = build_assets()
+    print(f"Built {len(manifest)} assets into {os.path.normpath(DIST_DIR)}")
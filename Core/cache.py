@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from Core.utils import load_config
+
+try:
+    import redis
+except ImportError:  # only needed when cache.backend is "redis"
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE = {
+    'backend': 'memory',
+    'redis_url': 'redis://localhost:6379/0',
+    'max_entries': 2048,
+    'key_prefix': 'moa',
+}
+
+
+def hash_key(*parts: str) -> str:
+    """Stable short key for arbitrary text (messages, prompts)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class CacheBackend(ABC):
+    """Key/value store shared by sessions, sentiment results, titles and rate limits.
+
+    Values must be JSON-serializable so every backend behaves the same way.
+    """
+
+    @abstractmethod
+    def get(self, key: str, default=None):
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value, ttl: float | None = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        """Atomically add `amount` to a counter; `ttl` applies when the counter is created."""
+
+    @abstractmethod
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        """Set `key` only if it does not exist yet. Returns whether it was set."""
+
+    @abstractmethod
+    def get_many(self, keys: list) -> list:
+        """Values for `keys` in order, None for missing ones."""
+
+
+class LRUCache(CacheBackend):
+    """In-process backend. Fast, but every worker process has its own copy."""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at or None, json string)
+        self._lock = threading.Lock()
+
+    def _get_entry(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set_entry(self, key: str, value: str, expires_at: float | None):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            entry = self._get_entry(key)
+        return default if entry is None else json.loads(entry[1])
+
+    def set(self, key: str, value, ttl: float | None = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._set_entry(key, json.dumps(value, ensure_ascii=False), expires_at)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                expires_at, count = (time.monotonic() + ttl if ttl else None), 0
+            else:
+                expires_at, count = entry[0], json.loads(entry[1])
+            count += amount
+            self._set_entry(key, json.dumps(count), expires_at)
+            return count
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if self._get_entry(key) is not None:
+                return False
+            self._set_entry(key, json.dumps(value, ensure_ascii=False), expires_at)
+            return True
+
+    def get_many(self, keys: list) -> list:
+        return [self.get(key) for key in keys]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """Backend for anything that speaks the Redis protocol (Redis, Valkey, fakeredis).
+
+    Shared by every gunicorn worker and node pointed at the same server.
+    """
+
+    def __init__(self, client=None, url: str | None = None, prefix: str = 'moa'):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("cache.backend is 'redis' but the redis package is not installed (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str, default=None):
+        value = self.client.get(self._key(key))
+        if value is None:
+            return default
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl: float | None = None):
+        payload = json.dumps(value, ensure_ascii=False)
+        if ttl:
+            self.client.set(self._key(key), payload, px=int(ttl * 1000))
+        else:
+            self.client.set(self._key(key), payload)
+
+    def delete(self, key: str):
+        self.client.delete(self._key(key))
+
+    def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        full_key = self._key(key)
+        count = self.client.incrby(full_key, amount)
+        if ttl and count == amount:
+            # First increment created the counter; start its window now
+            self.client.pexpire(full_key, int(ttl * 1000))
+        return int(count)
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        payload = json.dumps(value, ensure_ascii=False)
+        return bool(self.client.set(self._key(key), payload, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def get_many(self, keys: list) -> list:
+        if not keys:
+            return []
+        values = self.client.mget([self._key(key) for key in keys])
+        return [None if value is None else json.loads(value.decode('utf-8') if isinstance(value, bytes) else value)
+                for value in values]
+
+
+class NamespacedCache(CacheBackend):
+    """View of a backend that keeps one feature's keys apart from the others."""
+
+    def __init__(self, backend: CacheBackend, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str, default=None):
+        return self.backend.get(self._key(key), default)
+
+    def set(self, key: str, value, ttl: float | None = None):
+        self.backend.set(self._key(key), value, ttl)
+
+    def delete(self, key: str):
+        self.backend.delete(self._key(key))
+
+    def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        return self.backend.incr(self._key(key), amount, ttl)
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        return self.backend.add(self._key(key), value, ttl)
+
+    def get_many(self, keys: list) -> list:
+        return self.backend.get_many([self._key(key) for key in keys])
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_cache_config() -> dict:
+    cache_config = dict(DEFAULT_CACHE)
+    cache_config.update(load_config().get('cache', {}))
+    if os.getenv('REDIS_URL'):
+        cache_config['backend'] = 'redis'
+        cache_config['redis_url'] = os.getenv('REDIS_URL')
+    return cache_config
+
+
+def _create_backend() -> CacheBackend:
+    cache_config = get_cache_config()
+    if cache_config['backend'] == 'redis':
+        logger.info("Using Redis cache backend.")
+        return RedisCache(url=cache_config['redis_url'], prefix=cache_config['key_prefix'])
+    logger.info("Using in-process LRU cache backend.")
+    return LRUCache(max_entries=cache_config['max_entries'])
+
+
+def set_cache_backend(backend: CacheBackend | None):
+    """Replace the shared backend (e.g. with RedisCache(client=fakeredis.FakeRedis()))."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def get_cache(namespace: str) -> CacheBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _create_backend()
+        return NamespacedCache(_backend, namespace)
+
+
+def cache_is_shared() -> bool:
+    """Whether cached values are visible to every worker, i.e. the backend is not the in-process LRU."""
+    return not isinstance(get_cache('').backend, LRUCache)
+
+
+class RateLimiter:
+    """Fixed-window request counter stored in the shared cache."""
+
+    def __init__(self, name: str, limit: int, window_seconds: int = 60):
+        self.cache = get_cache(f"ratelimit:{name}")
+        self.limit = limit
+        self.window_seconds = window_seconds
+
+    def allow(self, identity: str) -> bool:
+        if self.limit <= 0:
+            return True
+        window = int(time.time() // self.window_seconds)
+        count = self.cache.incr(f"{identity}:{window}", ttl=self.window_seconds)
+        return count <= self.limit
@@ -23,6 +23,12 @@ os.environ['GRPC_TRACE'] = ''
 
 from utils import load_config
 from mood_logger import log_mood, get_recent_moods, get_moods_by_date
+from Core.cache import get_cache, hash_key
+from Core.title_cache import TitleCache
+from Core.keywords import (
+    POSITIVE_WORDS, NEGATIVE_WORDS, CRISIS_KEYWORDS, EMERGENCY_RESOURCES, SUPPORTIVE_RESPONSE,
+    keyword_sentiment, handle_crisis_message
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -44,14 +50,20 @@ if not GEMINI_API_KEY:
 
 genai.configure(api_key=GEMINI_API_KEY)
 
-POSITIVE_WORDS = ["happy", "calm", "grateful", "excited", "better", "hopeful", "good", "great", "well", "fine", "joyful", "peaceful"]
-NEGATIVE_WORDS = ["sad", "angry", "anxious", "depressed", "tired", "hopeless", "bad", "stressed", "frustrated", "lonely", "empty"]
-
 TWINWORD_API_HOST = "twinword-sentiment-analysis.p.rapidapi.com"
 TWINWORD_API_URL = "https://twinword-sentiment-analysis.p.rapidapi.com/analyze/"
 
+SENTIMENT_CACHE_TTL = 24 * 3600
+SESSION_CACHE_TTL = 24 * 3600
+
+sentiment_cache = get_cache('sentiment')
+
 def detect_mood_twinword(message: str) -> str | None:
    
+    cache_key = hash_key(message)
+    cached_mood = sentiment_cache.get(cache_key)
+    if cached_mood:
+        return cached_mood
     try:
         response = requests.get(
             TWINWORD_API_URL,
@@ -63,6 +75,7 @@ def detect_mood_twinword(message: str) -> str | None:
         )
         data = response.json()
         if data.get("result_code") == "200":
+            sentiment_cache.set(cache_key, data.get("type"), ttl=SENTIMENT_CACHE_TTL)
             return data.get("type")
     except Exception as e:
         print(f"Twinword API error: {e}")
@@ -74,36 +87,7 @@ def detect_mood(message: str) -> str:
     if mood in ("positive", "negative", "neutral"):
         return mood
 
-    text = message.lower()
-    score = 0
-    for word in POSITIVE_WORDS:
-        if word in text:
-            score += 1
-    for word in NEGATIVE_WORDS:
-        if word in text:
-            score -= 1
-    if score > 0: return "positive"
-    if score < 0: return "negative"
-    return "neutral"
-
-CRISIS_KEYWORDS = [
-    "suicide", "kill myself", "end my life", "can't go on", "hopeless",
-    "helpless", "worthless", "no reason to live", "done with everything",
-    "self-harm", "cut myself", "hurt myself", "die", "want to die",
-    "overdose", "bipolar", "depressed", "anxiety attacks", "mental health crisis"
-]
-
-EMERGENCY_RESOURCES = [
-    "**If you are in immediate danger, please contact your local emergency services immediately.** (e.g., dial 911 in the US/Canada, 999 in the UK, 112 in most of Europe, or your country's equivalent emergency number).",
-    "You are not alone, and help is available. Please consider reaching out to a crisis hotline or mental health support line.",
-    "- **Worldwide:** Search online for 'crisis hotline near me' or 'mental health support [your country]'.",
-    "- **International Association for Suicide Prevention (IASP):** Provides a global directory of crisis centers.",
-    "- **Befrienders Worldwide:** Offers emotional support in many countries.",
-    "- **Crisis Text Line (US/Canada/UK/Ireland):** Text HOME to 741741 (US & Canada), 85258 (UK), or 50808 (Ireland) for free, confidential crisis support 24/7.",
-    "Remember, taking care of your mental well-being is a sign of strength. We are here to support you in finding the help you need."
-]
-
-SUPPORTIVE_RESPONSE = "I hear that you're going through a difficult time. Please know that your feelings are valid, and it takes immense courage to reach out. I want to help you find the support you deserve. It's okay to ask for help, and there are people who care about you. Consider connecting with a professional or trusted person in your life."
+    return keyword_sentiment(message)
 
 def get_time(query: str) -> str:
     
@@ -123,15 +107,6 @@ def handle_general_query(query: str) -> str:
         return "Hello! How can I help?"
     return None
 
-def handle_crisis_message(query: str) -> str | None:
-    
-    normalized_query = query.lower()
-    for keyword in CRISIS_KEYWORDS:
-        if keyword in normalized_query:
-            response = SUPPORTIVE_RESPONSE + "\n\n" + "\n".join(EMERGENCY_RESOURCES)
-            return response
-    return None
-
 def show_help() -> str:
    
     help_text = [
@@ -156,11 +131,15 @@ def extract_and_store_name(query: str, user_profile: dict) -> str | None:
 
 class MoodAnalyzer:
     def __init__(self):
-        self.POSITIVE_WORDS = ["happy", "calm", "grateful", "excited", "better", "hopeful", "good", "great", "well", "fine", "joyful", "peaceful"]
-        self.NEGATIVE_WORDS = ["sad", "angry", "anxious", "depressed", "tired", "hopeless", "bad", "stressed", "frustrated", "lonely", "empty"]
+        self.POSITIVE_WORDS = list(POSITIVE_WORDS)
+        self.NEGATIVE_WORDS = list(NEGATIVE_WORDS)
 
     def analyze_with_api(self, message: str) -> str | None:
         
+        cache_key = hash_key(message)
+        cached_mood = sentiment_cache.get(cache_key)
+        if cached_mood:
+            return cached_mood
         try:
             response = requests.get(
                 TWINWORD_API_URL,
@@ -172,6 +151,7 @@ class MoodAnalyzer:
             )
             data = response.json()
             if data.get("result_code") == "200":
+                sentiment_cache.set(cache_key, data.get("type"), ttl=SENTIMENT_CACHE_TTL)
                 return data.get("type")
         except Exception as e:
             print(f"Twinword API error: {e}")
@@ -179,17 +159,23 @@ class MoodAnalyzer:
 
     def analyze_with_keywords(self, message: str) -> str:
        
-        text = message.lower()
-        score = 0
-        for word in self.POSITIVE_WORDS:
-            if word in text:
-                score += 1
-        for word in self.NEGATIVE_WORDS:
-            if word in text:
-                score -= 1
-        if score > 0: return "positive"
-        if score < 0: return "negative"
-        return "neutral"
+        return keyword_sentiment(message, self.POSITIVE_WORDS, self.NEGATIVE_WORDS)
+
+BREATHING_KEYWORDS = ["breath", "breathe", "breathing", "calm down", "panic", "relax"]
+
+FALLBACK_RESPONSES = {
+    "positive": "I'm really glad to hear that! Hold on to that feeling, and tell me more whenever you like.",
+    "negative": "I'm sorry you're feeling this way. Your feelings are valid, and I'm here with you. If it helps, try a slow breath in for 4 counts and out for 4 counts.",
+    "neutral": "Thank you for sharing that with me. I'm here and listening whenever you want to tell me more.",
+}
+
+FALLBACK_NOTICE = "(I'm a little overwhelmed right now, so my reply is shorter than usual.)"
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of an apology message when the caller wants to degrade gracefully."""
+
+# Failures of the Gemini service itself; only these count against upstream health
+UPSTREAM_ERRORS = (api_exceptions.GoogleAPIError, TimeoutError, ConnectionError)
 
 def guided_breathing_exercise() -> List[str]:
     
@@ -204,6 +190,17 @@ def guided_breathing_exercise() -> List[str]:
         "Well done! Remember you can do this exercise anytime you need to calm down."
     ]
 
+def _session_turn(item) -> dict | None:
+    """A stored history item as a chat-session turn, or None when it is malformed or empty.
+
+    Stored history can come from clients (/save_conversation, /import), so nothing about its shape is assumed.
+    """
+    if not isinstance(item, dict) or item.get('role') not in ('user', 'model') or not isinstance(item.get('parts'), list):
+        return None
+    parts = [{'text': part['text']} for part in item['parts']
+             if isinstance(part, dict) and isinstance(part.get('text'), str) and part['text']]
+    return {'role': item['role'], 'parts': parts} if parts else None
+
 class ChatBot:
     def __init__(self, chat_model_name: str, title_model_name: str):
         logger.info("Initializing ChatBot models...")
@@ -239,7 +236,7 @@ class ChatBot:
             raise
             
        
-        system_prompt = (
+        self.system_prompt = system_prompt = (
             "You are Moa, a highly empathetic, gentle, and emotionally intelligent well-being companion. "
             "Your core purpose is to offer kind, supportive, and helpful emotional support, like a comforting pixel-art RPG helper. "
             "You listen attentively, reflect user feelings, and respond with genuine care. "
@@ -257,7 +254,58 @@ class ChatBot:
            
             self.conversation = self.chat_model.start_chat(history=[])
 
-    def get_response(self, message: str) -> str:
+        # Per-conversation chat histories live in the shared cache so any worker can continue them
+        self.sessions = get_cache('sessions')
+        self.title_cache = TitleCache()
+        self.max_session_history = load_config().get('max_conversation_history', 50)
+        self.mood_analyzer = MoodAnalyzer()
+
+    def _session_seed(self) -> list:
+        # Seeding the system prompt as history avoids one upstream round trip per new session
+        return [
+            {'role': 'user', 'parts': [{'text': self.system_prompt}]},
+            {'role': 'model', 'parts': [{'text': "Understood. I'm Moa, and I'm here to listen."}]},
+        ]
+
+    def _start_session(self, session_key: str, stored_history: list | None = None):
+        history = self.sessions.get(session_key)
+        if history is None:
+            # Evicted or expired (or never cached): rebuild from the saved conversation
+            recent = [_session_turn(item) for item in (stored_history or [])[-self.max_session_history:]]
+            history = self._session_seed() + [item for item in recent if item]
+            if recent:
+                logger.debug(f"Session '{session_key}' rebuilt from {len(recent)} stored turns")
+        return self.chat_model.start_chat(history=history)
+
+    def _save_session(self, session_key: str, conversation):
+        history = [
+            {'role': content.role, 'parts': [{'text': part.text} for part in content.parts]}
+            for content in conversation.history
+        ]
+        seed = history[:2]
+        recent = history[2:][-self.max_session_history:]
+        self.sessions.set(session_key, seed + recent, ttl=SESSION_CACHE_TTL)
+
+    def end_session(self, session_key: str):
+        """Forget a conversation's cached chat history, e.g. when the conversation is deleted."""
+        self.sessions.delete(session_key)
+
+    def get_fallback_response(self, message: str) -> str:
+        """Answer without calling Gemini; used when the app is overloaded or upstream is failing."""
+        crisis_response = handle_crisis_message(message)
+        if crisis_response:
+            return crisis_response
+
+        normalized_message = message.lower()
+        if any(keyword in normalized_message for keyword in BREATHING_KEYWORDS):
+            return "\n".join(guided_breathing_exercise())
+
+        mood = self.mood_analyzer.analyze_with_keywords(message)
+        return f"{FALLBACK_RESPONSES[mood]}\n\n{FALLBACK_NOTICE}"
+
+    def get_response(self, message: str, session_key: str | None = None, timeout: float | None = None,
+                     raise_upstream_errors: bool = False, history: list | None = None) -> str:
+        """`history` is the conversation as saved, used to rebuild the session if it left the cache."""
         try:
             logger.debug(f"Sending message to model: {message}")
             
@@ -266,10 +314,14 @@ class ChatBot:
             if crisis_response:
                 return crisis_response
             
-            response = self.conversation.send_message(
+            conversation = self._start_session(session_key, history) if session_key else self.conversation
+            response = conversation.send_message(
                 message, 
-                safety_settings=self.safety_settings
+                safety_settings=self.safety_settings,
+                request_options={'timeout': timeout} if timeout else None
             )
+            if session_key:
+                self._save_session(session_key, conversation)
             logger.debug(f"Raw model response: {response}")
             bot_response_text = response.text
             logger.debug(f"Extracted bot response text: {bot_response_text}")
@@ -278,18 +330,29 @@ class ChatBot:
         except BlockedPromptException as e:
             logger.warning(f"Blocked prompt: {e}", exc_info=True)
             return "I cannot respond to that query as it violates safety guidelines. Please try rephrasing your message."
+        except UPSTREAM_ERRORS as e:
+            logger.error(f"Upstream error in get_response: {str(e)}", exc_info=True)
+            if raise_upstream_errors:
+                raise UpstreamUnavailable(str(e)) from e
+            return self._error_message(e)
         except Exception as e:
             logger.error(f"Error in get_response: {str(e)}", exc_info=True)
-            
-            error_msg = str(e).lower()
-            if "quota" in error_msg or "limit" in error_msg:
-                return "I'm experiencing high usage right now. Please try again in a moment."
-            elif "network" in error_msg or "connection" in error_msg:
-                return "I'm having trouble connecting right now. Please check your internet connection and try again."
-            else:
-                return f"I apologize, but I encountered an error. Please try rephrasing your message or try again later."
-
-    def generate_conversation_title(self, conversation_history: list, response_config: dict) -> str:
+            if raise_upstream_errors:
+                # Local failures (e.g. a malformed stored history) are not upstream outages
+                raise
+            return self._error_message(e)
+
+    def _error_message(self, e: Exception) -> str:
+        error_msg = str(e).lower()
+        if "quota" in error_msg or "limit" in error_msg:
+            return "I'm experiencing high usage right now. Please try again in a moment."
+        elif "network" in error_msg or "connection" in error_msg:
+            return "I'm having trouble connecting right now. Please check your internet connection and try again."
+        else:
+            return f"I apologize, but I encountered an error. Please try rephrasing your message or try again later."
+
+    def generate_conversation_title(self, conversation_history: list, response_config: dict,
+                                    timeout: float | None = None, raise_upstream_errors: bool = False) -> str:
         try:
             summary_parts = []
             for item in conversation_history:
@@ -299,20 +362,28 @@ class ChatBot:
 
             context = "\n".join(summary_parts[-4:])
 
-            prompt = f"Generate a very short, concise, and engaging title (3-5 words, maximum 10 words) for the following conversation. The title should capture the main topic or emotion. Do NOT include quotation marks, specific names, or introductory phrases like 'Conversation about'. Just the title.\n\nConversation:\n{context}\n\nTitle:"
-
-            response = self.title_model.generate_content(
-                prompt,
-                safety_settings=self.safety_settings
-            )
-            title = response.text.strip()
-
-            
-            title = re.sub(r'["\'.]', '', title)
-            title = re.sub(r'^(Conversation about|Chat about|Topic:)\s*', '', title, flags=re.IGNORECASE)
-            title = title.replace('"', '').strip()
-
-            return title
+            return self.title_cache.get_or_generate(context, lambda: self._request_title(context, timeout))
+        except UPSTREAM_ERRORS as e:
+            logger.error(f"Upstream error generating conversation title: {str(e)}")
+            if raise_upstream_errors:
+                raise UpstreamUnavailable(str(e)) from e
+            return "Untitled Conversation"
         except Exception as e:
             logger.error(f"Error generating conversation title: {str(e)}")
             return "Untitled Conversation"
+
+    def _request_title(self, context: str, timeout: float | None = None) -> str:
+        prompt = f"Generate a very short, concise, and engaging title (3-5 words, maximum 10 words) for the following conversation. The title should capture the main topic or emotion. Do NOT include quotation marks, specific names, or introductory phrases like 'Conversation about'. Just the title.\n\nConversation:\n{context}\n\nTitle:"
+
+        response = self.title_model.generate_content(
+            prompt,
+            safety_settings=self.safety_settings,
+            request_options={'timeout': timeout} if timeout else None
+        )
+        title = response.text.strip()
+
+        title = re.sub(r'["\'.]', '', title)
+        title = re.sub(r'^(Conversation about|Chat about|Topic:)\s*', '', title, flags=re.IGNORECASE)
+        title = title.replace('"', '').strip()
+
+        return title
@@ -0,0 +1,52 @@
+# Keyword-based crisis detection and sentiment. No network or model dependencies,
+# so offline tools and worker processes can import it without starting the chatbot.
+
+POSITIVE_WORDS = ["happy", "calm", "grateful", "excited", "better", "hopeful", "good", "great", "well", "fine", "joyful", "peaceful"]
+NEGATIVE_WORDS = ["sad", "angry", "anxious", "depressed", "tired", "hopeless", "bad", "stressed", "frustrated", "lonely", "empty"]
+
+CRISIS_KEYWORDS = [
+    "suicide", "kill myself", "end my life", "can't go on", "hopeless",
+    "helpless", "worthless", "no reason to live", "done with everything",
+    "self-harm", "cut myself", "hurt myself", "die", "want to die",
+    "overdose", "bipolar", "depressed", "anxiety attacks", "mental health crisis"
+]
+
+EMERGENCY_RESOURCES = [
+    "**If you are in immediate danger, please contact your local emergency services immediately.** (e.g., dial 911 in the US/Canada, 999 in the UK, 112 in most of Europe, or your country's equivalent emergency number).",
+    "You are not alone, and help is available. Please consider reaching out to a crisis hotline or mental health support line.",
+    "- **Worldwide:** Search online for 'crisis hotline near me' or 'mental health support [your country]'.",
+    "- **International Association for Suicide Prevention (IASP):** Provides a global directory of crisis centers.",
+    "- **Befrienders Worldwide:** Offers emotional support in many countries.",
+    "- **Crisis Text Line (US/Canada/UK/Ireland):** Text HOME to 741741 (US & Canada), 85258 (UK), or 50808 (Ireland) for free, confidential crisis support 24/7.",
+    "Remember, taking care of your mental well-being is a sign of strength. We are here to support you in finding the help you need."
+]
+
+SUPPORTIVE_RESPONSE = "I hear that you're going through a difficult time. Please know that your feelings are valid, and it takes immense courage to reach out. I want to help you find the support you deserve. It's okay to ask for help, and there are people who care about you. Consider connecting with a professional or trusted person in your life."
+
+def keyword_sentiment(message: str, positive_words: list = POSITIVE_WORDS, negative_words: list = NEGATIVE_WORDS) -> str:
+    
+    text = message.lower()
+    score = 0
+    for word in positive_words:
+        if word in text:
+            score += 1
+    for word in negative_words:
+        if word in text:
+            score -= 1
+    if score > 0: return "positive"
+    if score < 0: return "negative"
+    return "neutral"
+
+def find_crisis_keywords(query: str, keywords: list = CRISIS_KEYWORDS) -> list[str]:
+    
+    normalized_query = query.lower()
+    return [keyword for keyword in keywords if keyword in normalized_query]
+
+def handle_crisis_message(query: str) -> str | None:
+    
+    normalized_query = query.lower()
+    for keyword in CRISIS_KEYWORDS:
+        if keyword in normalized_query:
+            response = SUPPORTIVE_RESPONSE + "\n\n" + "\n".join(EMERGENCY_RESOURCES)
+            return response
+    return None
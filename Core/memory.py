@@ -1,59 +1,102 @@
-import json
-import os
 import logging
+from datetime import datetime
 from dotenv import load_dotenv
 
+from Core.archive import (
+    ArchiveError, split_conversation_key, archive_lock, archive_path, read_archive_names, read_user_archive, write_user_archive
+)
+from Core.sharding import LEGACY_MEMORY_FILE, locked_write_shard, locked_read_shards, read_shards
+from Core.utils import load_config
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables (kept for other settings like GEMINI_API_KEY)
 load_dotenv()
 
-MEMORY_FILE = os.path.join(os.path.dirname(__file__), 'conversation_memory.json')
+# Single-shard location; see Core/sharding.py for the multi-shard layout
+MEMORY_FILE = LEGACY_MEMORY_FILE
+
+def _archive_compression() -> str:
+    return load_config().get('retention', {}).get('compression', 'gzip')
 
-def _read_all_conversations() -> dict:
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {} # Return empty dict if JSON is invalid
-    return {}
+def _rehydrate_conversation(conversation_name: str) -> dict | None:
+    """Move an archived conversation back into the hot store on first access."""
+    user_id, _ = split_conversation_key(conversation_name)
+    # Most misses are brand-new conversations; don't take any lock for users without an archive
+    if not archive_path(user_id):
+        return None
+    with locked_write_shard(user_id) as shard, archive_lock(user_id):
+        try:
+            archived = read_user_archive(user_id)
+        except ArchiveError:
+            return None
+        conversation_data = archived.pop(conversation_name, None)
+        if conversation_data is None:
+            return None
 
-def _write_all_conversations(all_conversations: dict):
-    with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(all_conversations, f, ensure_ascii=False, indent=4)
+        conversation_data['updated_at'] = datetime.now().isoformat()
+        conversations = shard.read(strict=True)
+        conversations[conversation_name] = conversation_data
+        shard.write(conversations)
+        write_user_archive(user_id, archived, _archive_compression())
+    logger.info(f"Conversation '{conversation_name}' rehydrated from archive.")
+    return conversation_data
 
 def save_conversation(conversation_name: str, history: list, user_profile: dict):
-    all_conversations = _read_all_conversations()
-    all_conversations[conversation_name] = {
-        'history': history,
-        'user_profile': user_profile
-    }
-    _write_all_conversations(all_conversations)
+    user_id, _ = split_conversation_key(conversation_name)
+    with locked_write_shard(user_id) as shard:
+        conversations = shard.read(strict=True)
+        conversations[conversation_name] = {
+            'history': history,
+            'user_profile': user_profile,
+            'updated_at': datetime.now().isoformat()
+        }
+        shard.write(conversations)
     logger.debug(f"Conversation '{conversation_name}' saved to JSON.")
 
 def load_conversation(conversation_name: str) -> tuple[list, dict]:
-    all_conversations = _read_all_conversations()
-    conversation_data = all_conversations.get(conversation_name)
+    user_id, _ = split_conversation_key(conversation_name)
+    conversation_data = None
+    with locked_read_shards(user_id) as shards:
+        for shard in shards:
+            conversation_data = shard.read().get(conversation_name)
+            if conversation_data is not None:
+                break
+    if conversation_data is None:
+        conversation_data = _rehydrate_conversation(conversation_name)
     if conversation_data:
         logger.debug(f"Conversation '{conversation_name}' loaded from JSON.")
         return conversation_data.get('history', []), conversation_data.get('user_profile', {})
     return [], {}
 
 def list_conversations(user_id: str) -> list[str]:
-    all_conversations = _read_all_conversations()
     user_conversations = []
     prefix = f"{user_id}_"
-    for name in all_conversations.keys():
-        if name.startswith(prefix):
+    names = []
+    for shard in read_shards(user_id):
+        names.extend(shard.read().keys())
+    # Archived conversations stay visible; they are rehydrated when loaded
+    names.extend(read_archive_names(user_id))
+    for name in names:
+        if name.startswith(prefix) and name[len(prefix):] not in user_conversations:
             user_conversations.append(name[len(prefix):])
     logger.debug(f"Listed conversations for user '{user_id}' from JSON.")
     return user_conversations
 
 def delete_conversation(user_id: str, conversation_name: str):
     conversation_name_with_prefix = f"{user_id}_{conversation_name}"
-    all_conversations = _read_all_conversations()
-    if conversation_name_with_prefix in all_conversations:
-        del all_conversations[conversation_name_with_prefix]
-        _write_all_conversations(all_conversations)
-        logger.debug(f"Conversation '{conversation_name_with_prefix}' deleted from JSON.") 
+    with locked_read_shards(user_id) as shards:
+        for shard in shards:
+            conversations = shard.read(strict=True)
+            if conversation_name_with_prefix in conversations:
+                del conversations[conversation_name_with_prefix]
+                shard.write(conversations)
+                logger.debug(f"Conversation '{conversation_name_with_prefix}' deleted from JSON.")
+    if not archive_path(user_id):
+        return
+    with archive_lock(user_id):
+        archived = read_user_archive(user_id)
+        if conversation_name_with_prefix in archived:
+            del archived[conversation_name_with_prefix]
+            write_user_archive(user_id, archived, _archive_compression())
+            logger.debug(f"Conversation '{conversation_name_with_prefix}' deleted from archive.")
@@ -0,0 +1,80 @@
+import threading
+
+from Core.cache import cache_is_shared, get_cache
+
+# Counters and gauges exported in Prometheus text format at /metrics. With a
+# shared cache backend (Redis) counters live there, so every worker reports the
+# same totals; with the in-process cache they are counted per process.
+_values = {}
+_help = {}
+_types = {}
+_computed = {}
+_lock = threading.Lock()
+
+
+def register(name: str, help_text: str, metric_type: str = 'counter'):
+    with _lock:
+        _values.setdefault(name, 0)
+        _help[name] = help_text
+        _types[name] = metric_type
+
+
+def register_computed(name: str, help_text: str, compute, metric_type: str = 'gauge'):
+    """A metric derived from the others at scrape time; `compute(values)` gets the current snapshot."""
+    with _lock:
+        _help[name] = help_text
+        _types[name] = metric_type
+        _computed[name] = compute
+
+
+def _shared_counters():
+    return get_cache('metrics') if cache_is_shared() else None
+
+
+def inc(name: str, amount: float = 1):
+    shared = _shared_counters()
+    if shared is not None and _types.get(name, 'counter') == 'counter':
+        shared.incr(name, amount)
+        return
+    with _lock:
+        _values[name] = _values.get(name, 0) + amount
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _values[name] = value
+
+
+def get(name: str) -> float:
+    if name in _computed:
+        return snapshot()[name]
+    shared = _shared_counters()
+    if shared is not None and _types.get(name, 'counter') == 'counter':
+        return shared.get(name, 0)
+    with _lock:
+        return _values.get(name, 0)
+
+
+def snapshot() -> dict:
+    with _lock:
+        values = dict(_values)
+        computed = dict(_computed)
+    shared = _shared_counters()
+    if shared is not None:
+        counters = [name for name in values if _types.get(name, 'counter') == 'counter']
+        for name, value in zip(counters, shared.get_many(counters)):
+            values[name] = value or 0
+    for name, compute in computed.items():
+        values[name] = compute(values)
+    return values
+
+
+def render_prometheus() -> str:
+    lines = []
+    values = snapshot()
+    for name in sorted(values):
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {_types[name]}")
+        lines.append(f"{name} {values[name]}")
+    return "\n".join(lines) + "\n"
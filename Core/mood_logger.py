@@ -33,6 +33,8 @@ class MoodLogger:
                 'mood': mood_data.get('mood'),
                 'message': mood_data.get('message')
             }
+            if mood_data.get('user_id'):
+                mood_entry['user_id'] = mood_data['user_id']
             log_data = _load_mood_log()
             log_data.append(mood_entry)
             _save_mood_log(log_data)
@@ -48,6 +50,19 @@ mood_logger = MoodLogger()
 def log_mood(mood_data):
     return mood_logger.log_mood(mood_data)
 
+def append_moods(entries: list):
+    """Append several mood entries with a single read/write of the log."""
+    if not entries:
+        return
+    log_data = _load_mood_log()
+    log_data.extend(entries)
+    _save_mood_log(log_data)
+
+def iter_moods(user_id: str | None = None):
+    for entry in _load_mood_log():
+        if user_id is None or entry.get('user_id') == user_id:
+            yield entry
+
 def get_recent_moods(num_entries: int = 3):
     
     log_data = _load_mood_log()
@@ -0,0 +1,230 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries `X-Profile-Token: <ADMIN_TOKEN>` or is
+picked by `profiling.sample_rate`. Each profiled request writes to
+`profiling.output_dir`:
+
+  <id>.prof       cProfile stats (open with snakeviz or pstats)
+  <id>.collapsed  sampled stacks in collapsed format (flamegraph.pl, speedscope)
+  <id>.json       summary: duration, peak memory, top functions and allocations
+
+`GET /admin/profiles` (same header) lists the slowest captured requests.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request, jsonify
+
+from Core.utils import load_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILING = {
+    'sample_rate': 0.0,
+    'sampling_interval_ms': 5,
+    'output_dir': 'logs/profiles',
+    'top_entries': 25,
+}
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+# cProfile and tracemalloc are process-wide on recent Pythons, so profile one request at a time
+_profile_lock = threading.Lock()
+
+
+def get_profiling_config() -> dict:
+    profiling_config = dict(DEFAULT_PROFILING)
+    profiling_config.update(load_config().get('profiling', {}))
+    return profiling_config
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def is_admin(req) -> bool:
+    admin_token = os.getenv('ADMIN_TOKEN')
+    # compare_digest rejects non-ASCII str, so compare bytes
+    return bool(admin_token) and hmac.compare_digest(req.headers.get(PROFILE_HEADER, '').encode('utf-8'),
+                                                     admin_token.encode('utf-8'))
+
+
+def _should_profile(profiling_config: dict) -> bool:
+    if is_admin(request):
+        return True
+    return profiling_config['sample_rate'] > 0 and random.random() < profiling_config['sample_rate']
+
+
+def _start_profile(profiling_config: dict):
+    if not _should_profile(profiling_config):
+        return
+    if not _profile_lock.acquire(blocking=False):
+        logger.debug("Another request is being profiled; skipping this one.")
+        return
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    sampler = StackSampler(threading.get_ident(), profiling_config['sampling_interval_ms'] / 1000)
+    profiler = cProfile.Profile()
+    g.profile = {
+        'started_at': time.perf_counter(),
+        'profiler': profiler,
+        'sampler': sampler,
+        'started_tracemalloc': started_tracemalloc,
+    }
+    sampler.start()
+    profiler.enable()
+
+
+def _stop_profile(status_code: int | None, profiling_config: dict):
+    state = g.pop('profile', None)
+    if state is None:
+        return
+    try:
+        state['profiler'].disable()
+        duration_ms = (time.perf_counter() - state['started_at']) * 1000
+        state['sampler'].stop()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        allocations = tracemalloc.take_snapshot().statistics('lineno')[:profiling_config['top_entries']]
+        if state['started_tracemalloc']:
+            tracemalloc.stop()
+
+        _write_profile(state, duration_ms, peak_bytes, allocations, status_code, profiling_config)
+    except Exception as e:
+        logger.error(f"Failed to write request profile: {e}", exc_info=True)
+    finally:
+        _profile_lock.release()
+
+
+def _write_profile(state: dict, duration_ms: float, peak_bytes: int, allocations: list,
+                   status_code: int | None, profiling_config: dict):
+    output_dir = profiling_config['output_dir']
+    os.makedirs(output_dir, exist_ok=True)
+    endpoint = (request.endpoint or 'unknown').replace('.', '_')
+    profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+    base_path = os.path.join(output_dir, profile_id)
+
+    profiler = state['profiler']
+    profiler.dump_stats(base_path + '.prof')
+    with open(base_path + '.collapsed', 'w', encoding='utf-8') as f:
+        f.write(state['sampler'].collapsed())
+
+    stats = pstats.Stats(profiler)
+    top_functions = []
+    for (filename, line, name), (_, calls, total_time, cumulative_time, _) in sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:profiling_config['top_entries']]:
+        top_functions.append({
+            'function': f"{name} ({os.path.basename(filename)}:{line})",
+            'calls': calls,
+            'total_ms': round(total_time * 1000, 3),
+            'cumulative_ms': round(cumulative_time * 1000, 3),
+        })
+
+    summary = {
+        'id': profile_id,
+        'path': request.path,
+        'method': request.method,
+        'status': status_code,
+        'timestamp': datetime.now().isoformat(),
+        'duration_ms': round(duration_ms, 3),
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+        'samples': sum(state['sampler'].stacks.values()),
+        'top_functions': top_functions,
+        'top_allocations': [
+            {'location': str(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+            for stat in allocations
+        ],
+    }
+    with open(base_path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=4)
+    logger.info(f"Profiled {request.method} {request.path} in {duration_ms:.1f} ms -> {base_path}.*")
+
+
+def list_profiles(output_dir: str, limit: int = 20) -> list[dict]:
+    """Captured profile summaries (from every worker), slowest first."""
+    if not os.path.isdir(output_dir):
+        return []
+    summaries = []
+    for name in os.listdir(output_dir):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(output_dir, name), 'r', encoding='utf-8') as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({key: summary.get(key) for key in
+                              ('id', 'path', 'method', 'status', 'timestamp', 'duration_ms', 'peak_memory_kb')})
+    summaries.sort(key=lambda summary: summary['duration_ms'] or 0, reverse=True)
+    return summaries[:limit]
+
+
+def init_app(app):
+    """Register the profiling hooks and the /admin/profiles endpoint on a Flask app."""
+    profiling_config = get_profiling_config()
+    if not os.getenv('ADMIN_TOKEN'):
+        logger.info("ADMIN_TOKEN is not set; per-request profiling only runs when sampled.")
+
+    @app.before_request
+    def start_request_profile():
+        _start_profile(profiling_config)
+
+    @app.after_request
+    def stop_request_profile(response):
+        _stop_profile(response.status_code, profiling_config)
+        return response
+
+    @app.teardown_request
+    def cleanup_request_profile(exc):
+        # Unhandled exceptions skip after_request; make sure the profiler is released
+        _stop_profile(None, profiling_config)
+
+    @app.route('/admin/profiles', methods=['GET'])
+    def admin_profiles():
+        if not is_admin(request):
+            return jsonify({'error': 'Not found'}), 404
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({'success': True, 'profiles': list_profiles(profiling_config['output_dir'], limit)})
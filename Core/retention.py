@@ -0,0 +1,212 @@
+"""Tiered retention for saved conversations.
+
+Conversations that have been idle for `retention.idle_days` are moved out of
+the hot conversation shards into compressed per-user archives under
+`conversations/`. `memory.load_conversation` rehydrates them on first access.
+
+Every app worker calls `start_retention_job`, but only the one holding
+`logs/retention.lock` sweeps; the others retry each interval and take over
+if that worker exits. Shard and archive locks are cross-process, so a sweep
+never overwrites a conversation another worker has just saved or rehydrated.
+
+Run once by hand with:  python -m Core.retention [--dry-run] [--idle-days N]
+"""
+import os
+import argparse
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from Core.sharding import CorruptShardError, all_shards
+from Core.archive import ArchiveError, split_conversation_key, archive_lock, read_user_archive, write_user_archive, compress
+from Core.utils import FileLock, load_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION = {
+    'enabled': False,
+    'idle_days': 30,
+    'compression': 'gzip',
+    'interval_hours': 24,
+}
+
+LEADER_LOCK_FILE = os.path.join(os.path.dirname(__file__), '..', 'logs', 'retention.lock')
+
+
+def get_retention_config() -> dict:
+    retention_config = dict(DEFAULT_RETENTION)
+    retention_config.update(load_config().get('retention', {}))
+    return retention_config
+
+
+def _serialized_size(all_conversations: dict) -> int:
+    # Mirrors Shard.write so the estimate matches the file on disk
+    return len(json.dumps(all_conversations, ensure_ascii=False, indent=4).encode('utf-8'))
+
+
+def _is_idle(conversation_data: dict, cutoff: datetime) -> bool:
+    try:
+        return datetime.fromisoformat(conversation_data['updated_at']) < cutoff
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _archive_shard(shard, cutoff: datetime, compression: str, dry_run: bool) -> dict:
+    # Only pick the cold conversations under the shard lock; compressing archives
+    # can take a while and must not block saves and loads in every worker
+    with shard.lock:
+        conversations = shard.read(strict=True)
+        bytes_before = _serialized_size(conversations)
+
+        cold_by_user = {}
+        unstamped = 0
+        for name, conversation_data in conversations.items():
+            if 'updated_at' not in conversation_data:
+                # Saved before retention existed; start the idle clock now
+                unstamped += 1
+                if not dry_run:
+                    conversation_data['updated_at'] = datetime.now().isoformat()
+                continue
+            if _is_idle(conversation_data, cutoff):
+                user_id, _ = split_conversation_key(name)
+                cold_by_user.setdefault(user_id, {})[name] = conversation_data
+
+        if unstamped and not dry_run:
+            shard.write(conversations)
+
+    archive_bytes = 0
+    archived_names = {}
+    unreadable_users = 0
+    for user_id, cold in cold_by_user.items():
+        with archive_lock(user_id):
+            try:
+                archived = read_user_archive(user_id)
+            except ArchiveError:
+                # Never overwrite an archive we could not read; the conversations stay hot
+                unreadable_users += 1
+                continue
+            archived.update(cold)
+            if dry_run:
+                payload = json.dumps(archived, ensure_ascii=False).encode('utf-8')
+                archive_bytes += len(compress(payload, compression))
+            else:
+                archive_bytes += write_user_archive(user_id, archived, compression)
+        for name, conversation_data in cold.items():
+            archived_names[name] = conversation_data['updated_at']
+
+    remaining = dict(conversations)
+    for name in archived_names:
+        del remaining[name]
+    bytes_after = _serialized_size(remaining)
+
+    reverted = 0
+    if archived_names and not dry_run:
+        # Archives are written first so a crash here can only duplicate, never lose, a conversation
+        with shard.lock:
+            current = shard.read(strict=True)
+            changed_by_user = {}
+            for name, updated_at in archived_names.items():
+                if name in current and current[name].get('updated_at') == updated_at:
+                    del current[name]
+                else:
+                    # Saved again or deleted while its archive was being written
+                    changed_by_user.setdefault(split_conversation_key(name)[0], []).append(name)
+            shard.write(current)
+            for user_id, names in changed_by_user.items():
+                _drop_from_archive(user_id, names, compression)
+                reverted += len(names)
+
+    return {
+        'conversations_archived': len(archived_names) - reverted,
+        'users_affected': len(cold_by_user) - unreadable_users,
+        'users_skipped': unreadable_users,
+        'unstamped_conversations': unstamped,
+        'hot_bytes_before': bytes_before,
+        'hot_bytes_after': bytes_after,
+        'archive_bytes_written': archive_bytes,
+    }
+
+
+def _drop_from_archive(user_id: str, names: list, compression: str):
+    """Take back archive entries whose hot copy changed during the sweep, so a deletion can't be undone."""
+    with archive_lock(user_id):
+        try:
+            archived = read_user_archive(user_id)
+        except ArchiveError:
+            return
+        for name in names:
+            archived.pop(name, None)
+        write_user_archive(user_id, archived, compression)
+
+
+def run_retention(idle_days: int | None = None, dry_run: bool = False) -> dict:
+    """Archive conversations idle for more than `idle_days` and report what was (or would be) reclaimed."""
+    retention_config = get_retention_config()
+    idle_days = retention_config['idle_days'] if idle_days is None else idle_days
+    cutoff = datetime.now() - timedelta(days=idle_days)
+
+    report = {
+        'dry_run': dry_run,
+        'idle_days': idle_days,
+        'conversations_archived': 0,
+        'users_affected': 0,
+        'users_skipped': 0,
+        'unstamped_conversations': 0,
+        'hot_bytes_before': 0,
+        'hot_bytes_after': 0,
+        'archive_bytes_written': 0,
+    }
+    # Users never span shards, so each shard can be swept on its own
+    for shard in all_shards():
+        try:
+            shard_report = _archive_shard(shard, cutoff, retention_config['compression'], dry_run)
+        except CorruptShardError as e:
+            logger.error(f"Skipping shard in retention sweep: {e}")
+            continue
+        for key, value in shard_report.items():
+            report[key] += value
+    report['bytes_reclaimed'] = report['hot_bytes_before'] - report['hot_bytes_after']
+    logger.info(f"Retention run complete: {report}")
+    return report
+
+
+def start_retention_job(stop_event: threading.Event | None = None) -> threading.Thread | None:
+    """Start the periodic retention sweep in a daemon thread if it is enabled in settings."""
+    retention_config = get_retention_config()
+    if not retention_config['enabled']:
+        logger.info("Conversation retention is disabled.")
+        return None
+
+    stop_event = stop_event or threading.Event()
+    interval = retention_config['interval_hours'] * 3600
+    leader_lock = FileLock(LEADER_LOCK_FILE)
+
+    def _loop():
+        leader = False
+        while not stop_event.is_set():
+            # Held for the life of the process, so only one worker sweeps at a time
+            if not leader and leader_lock.acquire(blocking=False):
+                leader = True
+                logger.info("This process now runs the conversation retention sweep.")
+            if leader:
+                try:
+                    run_retention()
+                except Exception as e:
+                    logger.error(f"Retention run failed: {e}", exc_info=True)
+            stop_event.wait(interval)
+
+    thread = threading.Thread(target=_loop, name='conversation-retention', daemon=True)
+    thread.start()
+    logger.info(f"Conversation retention job started (every {retention_config['interval_hours']}h, "
+                f"idle after {retention_config['idle_days']} days).")
+    return thread
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Archive idle conversations.")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be archived.")
+    parser.add_argument('--idle-days', type=int, default=None, help="Override retention.idle_days.")
+    args = parser.parse_args()
+    print(json.dumps(run_retention(idle_days=args.idle_days, dry_run=args.dry_run), indent=4))
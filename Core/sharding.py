@@ -0,0 +1,257 @@
+"""Hash-partitioned conversation storage.
+
+Conversations are split by user_id across N JSON shard files so that each
+save only rewrites (and locks) one shard. The current layout lives in
+`storage_layout.json`; with a single shard the original
+`conversation_memory.json` is used unchanged.
+
+Reshard with:  python -m Core.sharding reshard 8
+
+While a reshard is running, writes go to the new layout and reads fall back
+to the old one. Every shard has a `<shard>.lock` file that app workers and
+the reshard command both flock(), so a shard is never rewritten by two
+processes at once. On platforms without fcntl (Windows) the locks only cover
+one process; stop the app before resharding there.
+"""
+import os
+import json
+import hashlib
+import logging
+import argparse
+import threading
+from contextlib import ExitStack, contextmanager
+
+from Core.archive import split_conversation_key
+from Core.utils import FileLock, atomic_write, load_config
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.path.dirname(__file__)
+LEGACY_MEMORY_FILE = os.path.join(STORAGE_DIR, 'conversation_memory.json')
+LAYOUT_FILE = os.path.join(STORAGE_DIR, 'storage_layout.json')
+
+
+class CorruptShardError(Exception):
+    """A shard file exists but does not hold a JSON object of conversations."""
+
+
+class Shard:
+    """One JSON file of conversations, with its own cross-process lock."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = FileLock(path + '.lock')
+
+    def read(self, strict: bool = False) -> dict:
+        """Conversations in this shard; {} when the file does not exist.
+
+        A file that exists but cannot be parsed reads as {} for display, but
+        raises CorruptShardError with `strict`, which every caller that writes
+        the shard back (or deletes it) must use.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                try:
+                    conversations = json.load(f)
+                except json.JSONDecodeError as e:
+                    conversations = e
+        except FileNotFoundError:  # Not created yet, or removed by a finished reshard
+            return {}
+        if isinstance(conversations, dict):
+            return conversations
+        logger.error(f"Shard '{self.path}' is corrupt: {conversations!r}")
+        if strict:
+            raise CorruptShardError(f"Shard '{self.path}' is corrupt; fix or restore it before writing to it")
+        return {}
+
+    def write(self, conversations: dict):
+        # Write to a temporary file first so readers never see a half-written shard
+        atomic_write(self.path, json.dumps(conversations, ensure_ascii=False, indent=4))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+_shards = {}
+_shards_lock = threading.Lock()
+_layout_cache = {'mtime': None, 'layout': {'shards': 1, 'migrating_to': None}}
+
+
+def shard_path(index: int, count: int) -> str:
+    if count == 1:
+        return LEGACY_MEMORY_FILE
+    return os.path.join(STORAGE_DIR, f"conversation_memory.{count}-{index:03d}.json")
+
+
+def get_shard(index: int, count: int) -> Shard:
+    path = shard_path(index, count)
+    with _shards_lock:
+        if path not in _shards:
+            _shards[path] = Shard(path)
+        return _shards[path]
+
+
+def shard_index(user_id: str, count: int) -> int:
+    # Python's hash() is salted per process; every worker must agree on placement
+    return int(hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:8], 16) % count
+
+
+def get_layout() -> dict:
+    """Current layout, re-read whenever another process (e.g. a reshard) changes it."""
+    try:
+        stat = os.stat(LAYOUT_FILE)
+    except FileNotFoundError:
+        return {'shards': 1, 'migrating_to': None}
+    # Every save replaces the file, so the inode changes even within one mtime tick
+    mtime = (stat.st_mtime_ns, stat.st_ino)
+    if mtime != _layout_cache['mtime']:
+        with open(LAYOUT_FILE, 'r', encoding='utf-8') as f:
+            layout = json.load(f)
+        layout.setdefault('migrating_to', None)
+        _layout_cache.update(mtime=mtime, layout=layout)
+    return _layout_cache['layout']
+
+
+def _save_layout(layout: dict):
+    atomic_write(LAYOUT_FILE, json.dumps(layout, indent=4))
+
+
+def write_shard(user_id: str) -> Shard:
+    """The shard new data for `user_id` goes to."""
+    layout = get_layout()
+    count = layout['migrating_to'] or layout['shards']
+    return get_shard(shard_index(user_id, count), count)
+
+
+def read_shards(user_id: str) -> list[Shard]:
+    """Shards that may hold data for `user_id`, newest layout first."""
+    layout = get_layout()
+    shards = [write_shard(user_id)]
+    if layout['migrating_to']:
+        shards.append(get_shard(shard_index(user_id, layout['shards']), layout['shards']))
+    return shards
+
+
+@contextmanager
+def locked_write_shard(user_id: str):
+    """Lock and yield the shard `user_id` writes to.
+
+    The layout is checked again once the lock is held: a reshard flips the
+    layout before it locks the old shards, so anything written here is either
+    seen by the migration or already lands in the new layout.
+    """
+    while True:
+        shard = write_shard(user_id)
+        with shard.lock:
+            if write_shard(user_id) is shard:
+                yield shard
+                return
+
+
+@contextmanager
+def locked_read_shards(user_id: str):
+    """Lock every shard that may hold `user_id`'s data and yield them, newest layout first.
+
+    Locks are taken oldest layout first, the same order a migration uses, so
+    a conversation cannot move between shards while they are being read.
+    """
+    while True:
+        shards = read_shards(user_id)
+        with ExitStack() as stack:
+            for shard in reversed(shards):
+                stack.enter_context(shard.lock)
+            if read_shards(user_id) == shards:
+                yield shards
+                return
+
+
+def all_shards() -> list[Shard]:
+    layout = get_layout()
+    shards = [get_shard(index, layout['shards']) for index in range(layout['shards'])]
+    if layout['migrating_to']:
+        shards += [get_shard(index, layout['migrating_to']) for index in range(layout['migrating_to'])]
+    return shards
+
+
+def _migrate_shard(source: Shard, new_count: int) -> int:
+    # Hold the source lock throughout so no worker can rewrite it mid-move
+    with source.lock:
+        conversations = source.read(strict=True)
+        if not conversations:
+            source.remove()
+            return 0
+
+        by_target = {}
+        for name, conversation_data in conversations.items():
+            by_target.setdefault(shard_index(split_conversation_key(name)[0], new_count), {})[name] = conversation_data
+
+        for index, moved in by_target.items():
+            target = get_shard(index, new_count)
+            with target.lock:
+                target_conversations = target.read(strict=True)
+                for name, conversation_data in moved.items():
+                    # Anything already in the new layout was written after the reshard started
+                    target_conversations.setdefault(name, conversation_data)
+                target.write(target_conversations)
+
+        source.remove()
+    return len(conversations)
+
+
+def reshard(new_count: int) -> int:
+    """Move every conversation into a `new_count`-shard layout. Returns the number moved."""
+    layout = get_layout()
+    if layout['migrating_to'] and layout['migrating_to'] != new_count:
+        raise RuntimeError(f"A reshard to {layout['migrating_to']} shards is already in progress; finish it first")
+    old_count = layout['shards']
+    if old_count == new_count:
+        logger.info(f"Storage already uses {new_count} shard(s).")
+        return 0
+
+    _save_layout({'shards': old_count, 'migrating_to': new_count})
+    logger.info(f"Resharding conversations from {old_count} to {new_count} shard(s)...")
+
+    moved = 0
+    # A corrupt source raises CorruptShardError and leaves the file alone; the
+    # layout stays mid-migration so the same command resumes once it is repaired.
+    # Workers re-check the layout under the shard lock (see locked_write_shard),
+    # so once a source shard is migrated nothing writes to it again
+    for index in range(old_count):
+        moved += _migrate_shard(get_shard(index, old_count), new_count)
+
+    _save_layout({'shards': new_count, 'migrating_to': None})
+    logger.info(f"Reshard complete: {moved} conversation(s) moved.")
+    return moved
+
+
+def check_layout():
+    """Warn when settings ask for a different shard count than the data on disk uses."""
+    configured = load_config().get('storage', {}).get('shards', 1)
+    layout = get_layout()
+    if layout['migrating_to']:
+        logger.warning(f"A reshard to {layout['migrating_to']} shards is in progress; "
+                       f"resume it with 'python -m Core.sharding reshard {layout['migrating_to']}'.")
+    elif configured != layout['shards']:
+        logger.warning(f"storage.shards is {configured} but conversations are stored in {layout['shards']} shard(s); "
+                       f"run 'python -m Core.sharding reshard {configured}' to migrate.")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage conversation storage shards.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    reshard_parser = subparsers.add_parser('reshard', help="Move conversations into a new number of shards.")
+    reshard_parser.add_argument('count', type=int)
+    subparsers.add_parser('status', help="Show the current layout.")
+    args = parser.parse_args()
+    if args.command == 'reshard':
+        if args.count < 1:
+            parser.error("count must be at least 1")
+        try:
+            reshard(args.count)
+        except CorruptShardError as e:
+            # The layout stays mid-migration; rerun the same command once the shard is repaired
+            parser.exit(1, f"Reshard stopped: {e}\n")
+    else:
+        print(json.dumps(get_layout(), indent=4))
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import logging
+import threading
+
+from Core import metrics
+from Core.cache import LRUCache, get_cache, hash_key
+from Core.utils import atomic_write, load_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TITLE_CACHE = {
+    'max_entries': 1024,
+    'warm_file': 'data/title_cache.jsonl',
+    'shared_ttl_seconds': 7 * 24 * 3600,
+}
+
+metrics.register('title_cache_hits_total', "Conversation titles served from cache.")
+metrics.register('title_cache_misses_total', "Conversation titles not found in cache.")
+metrics.register('title_cache_coalesced_total', "Title requests that waited on an identical in-flight request.")
+metrics.register('title_upstream_calls_total', "Title prompts sent to the title model.")
+metrics.register('title_upstream_calls_saved_total', "Title prompts avoided by caching or coalescing.")
+
+
+def _hit_ratio(values: dict) -> float:
+    saved_calls = values.get('title_upstream_calls_saved_total', 0)
+    total = saved_calls + values.get('title_upstream_calls_total', 0)
+    return round(saved_calls / total, 4) if total else 0
+
+
+metrics.register_computed('title_cache_hit_ratio', "Share of title requests answered without an upstream call.",
+                          _hit_ratio)
+
+
+def normalize_context(context: str) -> str:
+    """Fold case, punctuation and spacing so near-identical openers share a key."""
+    text = context.lower()
+    text = re.sub(r"[^\w\s:]", '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.title = None
+        self.error = None
+
+
+class TitleCache:
+    """Memoizes generated titles by normalized conversation context.
+
+    Lookups go local LRU -> shared cache backend; new titles are appended to a
+    JSONL warm store that is replayed into the LRU on startup. Identical
+    concurrent requests share one upstream call.
+    """
+
+    def __init__(self, max_entries: int | None = None, warm_file: str | None = None):
+        title_cache_config = dict(DEFAULT_TITLE_CACHE)
+        title_cache_config.update(load_config().get('title_cache', {}))
+        self.max_entries = max_entries or title_cache_config['max_entries']
+        self.warm_file = warm_file or title_cache_config['warm_file']
+        self.shared_ttl = title_cache_config['shared_ttl_seconds']
+
+        self.local = LRUCache(max_entries=self.max_entries)
+        self.shared = get_cache('titles')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._load_warm_store()
+
+    def _load_warm_store(self):
+        if not os.path.exists(self.warm_file):
+            return
+        entries = {}
+        lines = 0
+        with open(self.warm_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                # Later lines win and move to the most-recent end
+                entries.pop(entry['key'], None)
+                entries[entry['key']] = entry['title']
+        for key, title in list(entries.items())[-self.max_entries:]:
+            self.local.set(key, title)
+        if lines > 2 * self.max_entries:
+            self._compact(list(entries.items())[-self.max_entries:])
+        logger.info(f"Loaded {len(self.local)} cached titles from {self.warm_file}")
+
+    def _compact(self, entries: list):
+        # Every worker may compact at startup; each writes its own temp file and the last replace wins
+        lines = ''.join(json.dumps({'key': key, 'title': title}, ensure_ascii=False) + '\n' for key, title in entries)
+        try:
+            with self._warm_lock:
+                atomic_write(self.warm_file, lines)
+        except OSError as e:
+            logger.warning(f"Could not compact title cache warm store: {e}")
+
+    def _remember(self, key: str, title: str):
+        self.local.set(key, title)
+        self.shared.set(key, title, ttl=self.shared_ttl)
+        try:
+            with self._warm_lock:
+                os.makedirs(os.path.dirname(self.warm_file) or '.', exist_ok=True)
+                with open(self.warm_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'key': key, 'title': title}, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not persist title cache entry: {e}")
+
+    def _lookup(self, key: str) -> str | None:
+        title = self.local.get(key)
+        if title is None:
+            title = self.shared.get(key)
+            if title is not None:
+                self.local.set(key, title)
+        return title
+
+    def _record(self, saved: bool):
+        # The hit ratio is derived from these counters when /metrics is scraped
+        metrics.inc('title_upstream_calls_saved_total' if saved else 'title_upstream_calls_total')
+
+    def get_or_generate(self, context: str, generate) -> str:
+        """Return the cached title for `context`, or call `generate()` once for all concurrent callers."""
+        key = hash_key(normalize_context(context))
+        title = self._lookup(key)
+        if title is not None:
+            metrics.inc('title_cache_hits_total')
+            self._record(saved=True)
+            return title
+        metrics.inc('title_cache_misses_total')
+
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlight()
+
+        if not leader:
+            metrics.inc('title_cache_coalesced_total')
+            self._record(saved=True)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.title
+
+        try:
+            self._record(saved=False)
+            call.title = generate()
+            self._remember(key, call.title)
+            return call.title
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
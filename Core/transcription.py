@@ -0,0 +1,146 @@
+"""Whisper transcription, either in-process or through a shared local service.
+
+In "service" mode the Flask workers never import whisper/torch; they send the
+path of the uploaded audio file over a Unix socket to one process that holds
+the only copy of the model:
+
+    python -m Core.transcription --serve
+
+In "local" mode the model is loaded once per process, on the first request or,
+with `preload` enabled, when the app starts. Service mode is the way to share
+one model between gunicorn workers; do not use `gunicorn --preload`, since
+importing web_app also creates the Gemini gRPC client and the retention
+thread, which do not survive a fork.
+"""
+import os
+import json
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+
+from Core.utils import load_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSCRIPTION = {
+    'mode': 'local',
+    'socket_path': '/tmp/moa-transcription.sock',
+    'model_size': 'base',
+    'threads': 2,
+    'preload': False,
+    'timeout_seconds': 120,
+}
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_transcription_config() -> dict:
+    transcription_config = dict(DEFAULT_TRANSCRIPTION)
+    transcription_config.update(load_config().get('transcription', {}))
+    return transcription_config
+
+
+def load_model(model_size: str | None = None, threads: int | None = None):
+    """Load the Whisper model once per process."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            transcription_config = get_transcription_config()
+            model_size = model_size or transcription_config['model_size']
+            threads = threads or transcription_config['threads']
+
+            import torch
+            import whisper
+            torch.set_num_threads(threads)
+            logger.info(f"Loading Whisper model '{model_size}' with {threads} threads...")
+            _model = whisper.load_model(model_size)
+        return _model
+
+
+def _transcribe_local(audio_path: str) -> str:
+    model = load_model()
+    # A single model instance is not safe to run from several threads at once
+    with _model_lock:
+        result = model.transcribe(audio_path)
+    return result["text"]
+
+
+def _transcribe_remote(audio_path: str, socket_path: str, timeout: float) -> str:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps({'path': os.path.abspath(audio_path)}).encode('utf-8') + b'\n')
+        with client.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise RuntimeError("Transcription service closed the connection without answering")
+    reply = json.loads(line)
+    if 'error' in reply:
+        raise RuntimeError(f"Transcription service error: {reply['error']}")
+    return reply['text']
+
+
+def transcribe_file(audio_path: str) -> str:
+    transcription_config = get_transcription_config()
+    if transcription_config['mode'] == 'service':
+        return _transcribe_remote(audio_path, transcription_config['socket_path'],
+                                  transcription_config['timeout_seconds'])
+    return _transcribe_local(audio_path)
+
+
+def preload():
+    """Load the model at startup instead of on the first request, when running in preloaded local mode."""
+    transcription_config = get_transcription_config()
+    if transcription_config['mode'] == 'local' and transcription_config['preload']:
+        load_model()
+
+
+class _TranscriptionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request_data = json.loads(self.rfile.readline())
+            reply = {'text': _transcribe_local(request_data['path'])}
+        except Exception as e:
+            logger.error(f"Transcription request failed: {e}", exc_info=True)
+            reply = {'error': str(e)}
+        self.wfile.write(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class TranscriptionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: str | None = None, model_size: str | None = None, threads: int | None = None):
+    transcription_config = get_transcription_config()
+    socket_path = socket_path or transcription_config['socket_path']
+    load_model(model_size, threads)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with TranscriptionServer(socket_path, _TranscriptionHandler) as server:
+        os.chmod(socket_path, 0o660)
+        logger.info(f"Transcription service listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Shared Whisper transcription service.")
+    parser.add_argument('--serve', action='store_true', help="Run the service on a Unix socket.")
+    parser.add_argument('--socket', default=None, help="Override transcription.socket_path.")
+    parser.add_argument('--model-size', default=None, help="Override transcription.model_size (tiny, base, small...).")
+    parser.add_argument('--threads', type=int, default=None, help="Override transcription.threads.")
+    parser.add_argument('audio', nargs='?', help="Transcribe a single file and print the text.")
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.socket, args.model_size, args.threads)
+    elif args.audio:
+        print(transcribe_file(args.audio))
+    else:
+        parser.print_help()
@@ -0,0 +1,293 @@
+"""Streaming bulk export/import of conversations and mood entries as NDJSON.
+
+One JSON record per line:
+
+  {"type": "conversation", "user_id": ..., "name": ..., "history": [...], "user_profile": {...}, "updated_at": ...}
+  {"type": "mood", "user_id": ..., "timestamp": ..., "mood": ..., "message": ...}
+
+The same commands can move data between storage layouts or machines:
+
+  python -m Core.transfer export --gzip -o backup.ndjson.gz
+  python -m Core.transfer import backup.ndjson.gz
+
+Memory and time are bounded by the storage format, not by the stream:
+
+- Export holds one shard (or one user's archive) in memory at a time, so
+  with a single shard the whole conversation store is loaded at once.
+- Import writes conversations every `--batch-size` records, and every flush
+  rewrites the shard files it touches; large imports into large shards
+  should use a bigger batch. The mood log is a single JSON array, so mood
+  entries are collected and appended in one rewrite at the end.
+"""
+import os
+import sys
+import json
+import zlib
+import logging
+import argparse
+from datetime import datetime
+
+from Core.archive import ArchiveError, split_conversation_key, read_user_archive, archive_path, ARCHIVE_DIR
+from Core.mood_logger import iter_moods, append_moods
+from Core.sharding import all_shards, read_shards, write_shard
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_BATCH_SIZE = 200
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+def _conversation_record(conversation_name: str, conversation_data: dict) -> dict:
+    user_id, name = split_conversation_key(conversation_name)
+    return {
+        'type': 'conversation',
+        'user_id': user_id,
+        'name': name,
+        'history': conversation_data.get('history', []),
+        'user_profile': conversation_data.get('user_profile', {}),
+        'updated_at': conversation_data.get('updated_at'),
+    }
+
+
+def _archived_user_ids():
+    if not os.path.isdir(ARCHIVE_DIR):
+        return
+    for file_name in sorted(os.listdir(ARCHIVE_DIR)):
+        if file_name.endswith(('.json.gz', '.json.zst')):
+            yield file_name.split('.', 1)[0]
+
+
+def iter_records(user_id: str | None = None):
+    """Yield export records for one user, or for everyone when `user_id` is None."""
+    seen = set()
+    shards = read_shards(user_id) if user_id else all_shards()
+    for shard in shards:
+        with shard.lock:
+            conversations = shard.read()
+        for conversation_name, conversation_data in conversations.items():
+            if user_id and not conversation_name.startswith(f"{user_id}_"):
+                continue
+            if conversation_name in seen:
+                continue
+            seen.add(conversation_name)
+            yield _conversation_record(conversation_name, conversation_data)
+        del conversations
+
+    archive_users = [user_id] if user_id else _archived_user_ids()
+    for archive_user_id in archive_users:
+        if not archive_path(archive_user_id):
+            continue
+        try:
+            archived = read_user_archive(archive_user_id)
+        except ArchiveError:
+            continue  # Already logged; export everything else
+        for conversation_name, conversation_data in archived.items():
+            if conversation_name not in seen:
+                yield _conversation_record(conversation_name, conversation_data)
+
+    for entry in iter_moods(user_id):
+        yield {'type': 'mood', **entry}
+
+
+def iter_ndjson(records, compress: bool = False):
+    """Encode records as NDJSON byte chunks, optionally as one gzip stream."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    size = 0
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+class LineTooLong(ValueError):
+    """An input line exceeded MAX_LINE_BYTES once decompressed."""
+
+
+def iter_lines(read_chunk, max_line_bytes: int = MAX_LINE_BYTES):
+    """Yield decoded lines from a byte stream, transparently gunzipping it.
+
+    `read_chunk(size)` is a file-like read; it must return b'' at the end.
+    Decompression is bounded, so a small gzip bomb can't expand in memory;
+    a line longer than `max_line_bytes` raises LineTooLong.
+    """
+    first = read_chunk(CHUNK_SIZE)
+    decompressor = zlib.decompressobj(47) if first[:2] == b'\x1f\x8b' else None
+    pending = b''
+    chunk = first
+    while chunk:
+        data = chunk
+        while data:
+            if decompressor:
+                piece = decompressor.decompress(data, CHUNK_SIZE)
+                data = decompressor.unconsumed_tail
+            else:
+                piece, data = data, b''
+            if b'\n' in piece:
+                *lines, last = (pending + piece).split(b'\n')
+                pending = last
+                for line in lines:
+                    if len(line) > max_line_bytes:
+                        raise LineTooLong(f"Input line longer than {max_line_bytes} bytes")
+                    if line.strip():
+                        yield line.decode('utf-8')
+            else:
+                pending += piece
+            if len(pending) > max_line_bytes:
+                raise LineTooLong(f"Input line longer than {max_line_bytes} bytes")
+        chunk = read_chunk(CHUNK_SIZE)
+    if decompressor:
+        # Input is fully consumed by now, so only the last few bytes can remain
+        pending += decompressor.flush()
+        if len(pending) > max_line_bytes:
+            raise LineTooLong(f"Input line longer than {max_line_bytes} bytes")
+    if pending.strip():
+        yield pending.decode('utf-8')
+
+
+def _flush_conversations(batch: dict) -> int:
+    written = len(batch)
+    while batch:
+        # Group by shard so each shard is read and written once per batch
+        by_shard = {}
+        for conversation_name, conversation_data in batch.items():
+            user_id = split_conversation_key(conversation_name)[0]
+            shard = write_shard(user_id)
+            by_shard.setdefault(shard.path, (shard, user_id, {}))[2][conversation_name] = conversation_data
+        for shard, user_id, conversations in by_shard.values():
+            with shard.lock:
+                if write_shard(user_id) is not shard:
+                    continue  # A reshard started; regroup what is left under the new layout
+                stored = shard.read(strict=True)
+                stored.update(conversations)
+                shard.write(stored)
+            for conversation_name in conversations:
+                del batch[conversation_name]
+    return written
+
+
+def _valid_turn(turn) -> bool:
+    return (isinstance(turn, dict) and isinstance(turn.get('role'), str) and isinstance(turn.get('parts'), list)
+            and all(isinstance(part, dict) and isinstance(part.get('text'), str) for part in turn['parts']))
+
+
+def _parse_record(line: str, user_id: str | None) -> tuple[str, str | None, dict]:
+    """Decode and validate one line; raises ValueError/KeyError for records that cannot be stored."""
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("record is not a JSON object")
+    record_type = record.pop('type')
+    owner = user_id or record.pop('user_id', None)
+    if owner is not None and (not isinstance(owner, str) or '_' in owner):
+        # Stored keys are '<user_id>_<name>', split at the first underscore
+        raise ValueError(f"user_id {owner!r} must be a string without underscores")
+    if record_type == 'conversation':
+        if not owner:
+            raise KeyError('user_id')
+        if not isinstance(record['name'], str) or not record['name']:
+            raise ValueError("conversation name must be a non-empty string")
+        if not isinstance(record.get('history', []), list):
+            raise ValueError("conversation history must be a list")
+        for turn in record.get('history', []):
+            if not _valid_turn(turn):
+                raise ValueError(f"malformed history item {turn!r:.80}")
+        if not isinstance(record.get('user_profile') or {}, dict):
+            raise ValueError("user_profile must be an object")
+    elif record_type == 'mood':
+        # get_moods_by_date matches on the timestamp's date prefix
+        if not isinstance(record['timestamp'], str):
+            raise ValueError("mood timestamp must be a string")
+        datetime.fromisoformat(record['timestamp'])
+    return record_type, owner, record
+
+
+def _updated_at(value) -> str:
+    # Without a usable timestamp the retention sweep would never archive the conversation
+    try:
+        datetime.fromisoformat(value)
+        return value
+    except (TypeError, ValueError):
+        return datetime.now().isoformat()
+
+
+def import_records(lines, user_id: str | None = None, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Import NDJSON lines. With `user_id`, every record is re-owned by that user."""
+    counts = {'conversations': 0, 'moods': 0, 'skipped': 0}
+    conversations = {}
+    moods = []
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            record_type, owner, record = _parse_record(line, user_id)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Skipping line {line_number}: {e!r}")
+            counts['skipped'] += 1
+            continue
+
+        if record_type == 'conversation':
+            conversations[f"{owner}_{record['name']}"] = {
+                'history': record.get('history', []),
+                'user_profile': record.get('user_profile') or {},
+                'updated_at': _updated_at(record.get('updated_at')),
+            }
+            if len(conversations) >= batch_size:
+                counts['conversations'] += _flush_conversations(conversations)
+        elif record_type == 'mood':
+            mood_entry = {
+                'timestamp': record['timestamp'],
+                'mood': record.get('mood'),
+                'message': record.get('message'),
+            }
+            if owner:
+                mood_entry['user_id'] = owner
+            moods.append(mood_entry)
+        else:
+            counts['skipped'] += 1
+
+    counts['conversations'] += _flush_conversations(conversations)
+    append_moods(moods)
+    counts['moods'] += len(moods)
+    logger.info(f"Import complete: {counts}")
+    return counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Bulk export/import of conversations and moods.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help="Write NDJSON records to a file or stdout.")
+    export_parser.add_argument('--user', default=None, help="Only export this user_id.")
+    export_parser.add_argument('--gzip', action='store_true', help="gzip-compress the output.")
+    export_parser.add_argument('-o', '--output', default='-', help="Output file (default: stdout).")
+    import_parser = subparsers.add_parser('import', help="Read NDJSON (plain or gzip) records.")
+    import_parser.add_argument('input', help="Input file, or - for stdin.")
+    import_parser.add_argument('--user', default=None, help="Import everything as this user_id.")
+    import_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        try:
+            for chunk in iter_ndjson(iter_records(args.user), compress=args.gzip):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+    else:
+        source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+        try:
+            print(json.dumps(import_records(iter_lines(source.read), args.user, args.batch_size), indent=4))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
@@ -1,9 +1,16 @@
 import json
 import os
+import tempfile
+import threading
 from typing import Dict
 from pathlib import Path
 import sys
 
+try:
+    import fcntl
+except ImportError:  # Windows: FileLock falls back to a thread-only lock
+    fcntl = None
+
 class Colors:
     GREEN = '\033[92m'
     BLUE = '\033[94m'
@@ -27,4 +34,68 @@ def load_config() -> Dict:
         with open(config_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
-        raise Exception(f"Failed to load config: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to load config: {str(e)}")
+
+def atomic_write(path: str, data: str | bytes):
+    """Replace `path` with `data` via a unique temp file, so concurrent writers never share one."""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files owner-only
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FileLock:
+    """Exclusive lock shared by threads and processes, backed by flock() on `path`.
+
+    Re-entrant within a thread. On platforms without fcntl (Windows) it only
+    guards threads of the current process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking=blocking):
+            return False
+        if self._depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    self._thread_lock.release()
+                    if blocking:
+                        raise
+                    return False
+            self._fd = fd
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
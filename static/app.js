@@ -0,0 +1,495 @@
+document.addEventListener('DOMContentLoaded', () => {
+  // Ensure the background video always starts from the beginning
+  const video = document.getElementById('video-background');
+  if (video) {
+    video.currentTime = 0;
+    // Optionally, play it explicitly in case autoplay was blocked
+    video.play().catch(error => {
+        console.warn("Video autoplay prevented:", error);
+    });
+  }
+
+  let userMessageCount = 0;
+  let botMessageCount = 0;
+  let conversationHistory = [];
+  let userProfile = {};
+  let currentConversationName = 'default';
+  let discardTargetName = null;
+  let mediaRecorder;
+  let audioChunks = [];
+  let isRecording = false;
+
+  // Modal elements
+  const discardConfirmModal = document.getElementById('discard-confirm-modal');
+  const discardConfirmBtn = document.getElementById('discardConfirmBtn');
+  console.log('discardConfirmBtn element:', discardConfirmBtn); // Debugging: check if element is found
+  const discardCancelBtn = document.getElementById('discardCancelBtn');
+
+  // Main chat elements
+  const chatBox = document.getElementById('chatArea');
+  const chatInput = document.getElementById('user-input');
+  const chatForm = document.getElementById('chatForm');
+  const breathingExerciseBtn = document.getElementById('breathing-exercise-btn');
+  const voiceInputBtn = document.getElementById('voiceInputBtn');
+  
+  // Sidebar elements
+  const menuToggleBtn = document.getElementById('menuToggleBtn');
+  const conversationSidebar = document.getElementById('conversation-sidebar');
+  const sidebarCloseBtn = document.getElementById('sidebar-close-btn');
+  const conversationList = document.getElementById('conversation-list');
+  const newChatBtn = document.getElementById('new-chat-btn');
+  const conversationSearchInput = document.getElementById('conversationSearchInput');
+  const mainContentArea = document.querySelector('.main-content-area');
+
+
+  // --- Helper Functions ---
+
+  function renderConversationList(filter = '') {
+    fetch('/list_conversations')
+      .then(response => response.json())
+      .then(data => {
+        if (data.success) {
+          conversationList.innerHTML = '';
+          let conversations = data.conversations;
+
+          // Filter conversations based on search input
+          const filteredConversations = conversations.filter(name =>
+            name.toLowerCase().includes(filter.toLowerCase())
+          );
+
+          if (filteredConversations.length === 0) {
+            const noResult = document.createElement('div');
+            noResult.textContent = 'NO CONVERSATIONS FOUND';
+            noResult.style.padding = '16px';
+            noResult.style.color = '#355739';
+            noResult.style.fontFamily = "'Press Start 2P', cursive";
+            conversationList.appendChild(noResult);
+            return;
+          }
+
+          filteredConversations.forEach(name => {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'conversation-item';
+            if (name === currentConversationName) {
+              item.classList.add('active');
+            }
+            item.setAttribute('aria-label', `Open conversation ${name}`);
+            item.innerHTML = `
+              <div class="conversation-title">${name.toUpperCase()}</div>
+              <div class="conversation-snippet">Click to load...</div>
+              <div class="conversation-timestamp"></div>
+              <button class="discard-conversation-btn" data-conversation-name="${name}" title="Discard conversation" aria-label="Discard conversation ${name}">
+                <span class="material-icons" aria-hidden="true">delete_forever</span>
+              </button>
+            `;
+
+            // Attach event listeners
+            item.addEventListener('click', (e) => {
+              if (!e.target.closest('.discard-conversation-btn')) {
+                e.preventDefault();
+                e.stopPropagation();
+                loadAndDisplayConversation(name);
+                closeSidebar();
+              }
+            });
+
+            item.querySelector('.discard-conversation-btn').addEventListener('click', (e) => {
+              e.preventDefault();
+              e.stopPropagation();
+              console.log('Discard button clicked for:', name);
+              openDiscardModal(name);
+            });
+
+            conversationList.appendChild(item);
+          });
+        } else {
+          console.error('Error listing conversations:', data.message);
+          addSystemMessage("Failed to list conversations: " + data.message);
+        }
+      })
+      .catch(error => {
+        console.error('Network error:', error);
+        addSystemMessage('Network error during conversation list fetch.');
+      });
+  }
+
+  function addMessage(message, fromUser = true, isSystem = false) {
+    if (!message || (typeof message === 'string' && message.trim().length === 0)) return;
+    
+    const messageElement = document.createElement('div');
+    let senderClass = '';
+    
+    if (fromUser) {
+      senderClass = userMessageCount % 2 === 0 ? 'user-message' : 'user-message-alt';
+      userMessageCount++;
+    } else if (isSystem) {
+      senderClass = 'system-message';
+    } else {
+      senderClass = botMessageCount % 2 === 0 ? 'bot-message' : 'bot-message-alt';
+      botMessageCount++;
+    }
+    
+    messageElement.classList.add('message-bubble', senderClass);
+    
+    let displayText = '';
+    if (typeof message === 'string' || message instanceof String) {
+      displayText = String(message).trim();
+    } else if (typeof message === 'object' && message !== null) {
+      if (message.text !== undefined) {
+        displayText = String(message.text).trim();
+      } else {
+        displayText = JSON.stringify(message);
+      }
+    } else if (Array.isArray(message)) {
+      displayText = message.map(item => {
+        if (typeof item === 'object' && item !== null && item.text !== undefined) {
+          return String(item.text).trim();
+        } else if (typeof item === 'object' && item !== null) {
+          return JSON.stringify(item);
+        }
+        return String(item).trim();
+      }).join(' ');
+    } else {
+      displayText = String(message).trim();
+    }
+
+    messageElement.textContent = displayText;
+    chatBox.appendChild(messageElement);
+    chatBox.scrollTop = chatBox.scrollHeight;
+  }
+
+  function addSystemMessage(msg) {
+    addMessage(msg, false, true);
+  }
+
+  async function loadAndDisplayConversation(name) {
+    try {
+      const response = await fetch(`/load_conversation?conversation_name=${encodeURIComponent(name)}`);
+      const data = await response.json();
+      if (data.success) {
+        conversationHistory = data.history || [];
+        userProfile = data.user_profile || {};
+        currentConversationName = name;
+        chatBox.innerHTML = '';
+        // Only add messages if there is history. The initial greeting is always in the HTML.
+        if (conversationHistory.length > 0) {
+          userMessageCount = 0;
+          botMessageCount = 0;
+          conversationHistory.forEach(turn => {
+            if(turn.role === 'user' && turn.parts && turn.parts[0]){
+              addMessage(turn.parts[0], true);
+            } else if (turn.role === 'model' && turn.parts && turn.parts[0]){
+              addMessage(turn.parts[0], false);
+            }
+          });
+        }
+        addSystemMessage(`Loaded conversation: "${name}"`);
+        renderConversationList(conversationSearchInput.value);
+      } else {
+        addSystemMessage("Failed to load conversation: " + data.message);
+      }
+    } catch (error) {
+      console.error(error);
+      addSystemMessage("Network error during conversation load.");
+    }
+  }
+
+  async function sendMessage(message) {
+    if (!message.trim()) return;
+    addMessage(message, true);
+    chatInput.value = '';
+
+    try {
+      const response = await fetch('/chat', {
+        method: 'POST',
+        headers: {'Content-Type':'application/json'},
+        body: JSON.stringify({
+          message,
+          history: conversationHistory,
+          user_profile: userProfile,
+          conversation_name: currentConversationName
+        })
+      });
+      const data = await response.json();
+      if (data.response) {
+        addMessage(data.response, false);
+        conversationHistory = data.history || [];
+        userProfile = data.user_profile || {};
+        // Update conversation name if a new one was generated by the backend
+        if (data.conversation_name && data.conversation_name !== currentConversationName) {
+          currentConversationName = data.conversation_name;
+        }
+        renderConversationList(conversationSearchInput.value);
+      } else {
+        addSystemMessage("No response from bot.");
+      }
+    } catch (error) {
+      console.error(error);
+      addSystemMessage("Network error or server issue. Please try again.");
+    }
+  }
+
+  async function deleteConversation(name) {
+    console.log('Attempting to delete conversation:', name);
+    console.log('Sending request to /delete_conversation with name:', name);
+    try {
+      let res = await fetch('/delete_conversation', {
+        method: 'POST',
+        headers: {'Content-Type':'application/json'},
+        body: JSON.stringify({ conversation_name: name })
+      });
+      console.log('Received response from /delete_conversation');
+      let data = await res.json();
+      if(data.success){
+        addSystemMessage(`Conversation "${name}" discarded successfully.`);
+        console.log('Deletion successful, updating UI. Response:', data);
+        if(currentConversationName === name){
+          currentConversationName = 'default';
+          conversationHistory = [];
+          userProfile = {};
+          chatBox.innerHTML = `
+            <div class="avatar-greeting">
+              <div class="avatar" role="img" aria-label="Pixel art avatar of Moa, the chatbot therapist"></div>
+              <div class="greeting-text">Hi, I'm Moa, your pixel well-being companion!</div>
+            </div>`;
+          addSystemMessage("Switched to a new default chat.");
+        }
+        renderConversationList(conversationSearchInput.value);
+      } else {
+        addSystemMessage(`Failed to discard conversation: ${data.message}`);
+        console.error('Deletion failed: Backend message:', data.message);
+      }
+    } catch (error) {
+      console.error('Network error during conversation discard (frontend catch):', error);
+      addSystemMessage('Network error during conversation discard.');
+    }
+  }
+
+  // --- Modal and Sidebar Toggle Functions ---
+
+  function openSidebar() {
+    conversationSidebar.classList.add('open');
+    mainContentArea.classList.add('sidebar-open'); // Dim main content
+    conversationSearchInput.focus();
+  }
+  function closeSidebar() {
+    conversationSidebar.classList.remove('open');
+    mainContentArea.classList.remove('sidebar-open'); // Un-dim main content
+  }
+  function toggleSidebar() {
+    if (conversationSidebar.classList.contains('open')) {
+      closeSidebar();
+    } else {
+      openSidebar();
+    }
+  }
+
+  function openDiscardModal(name) {
+    discardTargetName = name;
+    discardConfirmModal.classList.remove('modal-hidden'); // Show by removing class
+    discardConfirmModal.classList.add('modal-visible'); // Ensure visibility and interactivity
+    discardConfirmModal.querySelector('.modal-content').focus();
+  }
+  function closeDiscardModal() {
+    discardConfirmModal.classList.add('modal-hidden'); // Hide by adding class
+    discardConfirmModal.classList.remove('modal-visible'); // Remove visibility for next open
+    discardTargetName = null;
+  }
+
+  // --- Event Listeners ---
+
+  chatForm.addEventListener('submit', e => {
+    e.preventDefault();
+    sendMessage(chatInput.value);
+  });
+
+  breathingExerciseBtn.addEventListener('click', () => {
+    fetch('/breathing_exercise', {
+      method: 'POST',
+      headers: {'Content-Type':'application/json'},
+      body: JSON.stringify({})
+    })
+    .then(res => res.json())
+    .then(data => {
+      if(data.steps){
+        addSystemMessage("Let's start a breathing exercise:");
+        data.steps.forEach(step => addMessage(step, false, true));
+      } else {
+        addSystemMessage('Error: Could not retrieve breathing exercise steps.');
+      }
+    })
+    .catch(err => {
+      console.error('Breathing exercise error:', err);
+      addSystemMessage('Network error or server issue during breathing exercise.');
+    });
+  });
+
+  newChatBtn.addEventListener('click', (e) => {
+    e.preventDefault();
+    currentConversationName = 'default';
+    conversationHistory = [];
+    userProfile = {};
+    userMessageCount = 0;
+    botMessageCount = 0;
+    chatBox.innerHTML = ''; // Clear chatbox completely on new chat
+    addSystemMessage("Started a new chat.");
+    closeSidebar();
+    renderConversationList(conversationSearchInput.value);
+  });
+
+  conversationSearchInput.addEventListener('input', e => {
+    renderConversationList(e.target.value);
+  });
+
+  discardCancelBtn.addEventListener('click', (e) => {
+    e.preventDefault();
+    closeDiscardModal();
+  });
+  
+  discardConfirmBtn.addEventListener('click', (e) => {
+    console.log('Discard Confirmation button click event triggered.'); // Debugging: Unconditional log
+    e.preventDefault();
+    console.log('Discard Confirmation button clicked for:', discardTargetName);
+    if (discardTargetName) {
+      deleteConversation(discardTargetName);
+      closeDiscardModal();
+    }
+  });
+
+  menuToggleBtn.addEventListener('click', (e) => {
+    e.preventDefault();
+    e.stopPropagation();
+    toggleSidebar();
+  });
+
+  sidebarCloseBtn.addEventListener('click', (e) => {
+    e.preventDefault();
+    closeSidebar();
+  });
+
+  // New: Voice Input functionality
+  voiceInputBtn.addEventListener('click', async () => {
+    // Feature detection for MediaDevices and MediaRecorder
+    if (!navigator.mediaDevices || !window.MediaRecorder) {
+        addSystemMessage("Audio input not supported by your browser.");
+        console.error("Browser does not support navigator.mediaDevices or MediaRecorder.");
+        return;
+    }
+
+    if (!isRecording) {
+      // Start recording
+      try {
+        // Request microphone access
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+
+        // Detect supported mimeType for MediaRecorder
+        const mimeType = MediaRecorder.isTypeSupported('audio/webm; codecs=opus') ? 'audio/webm; codecs=opus' : 'audio/webm';
+        
+        mediaRecorder = new MediaRecorder(stream, { mimeType: mimeType });
+        
+        mediaRecorder.ondataavailable = event => {
+          if (event.data.size > 0) {
+            audioChunks.push(event.data);
+          }
+        };
+        mediaRecorder.onstop = async () => {
+          // Create a Blob from the audio chunks using the determined mimeType
+          const audioBlob = new Blob(audioChunks, { type: mimeType });
+          audioChunks = []; // Clear for next recording
+
+          // Check if the blob is empty before sending
+          if (audioBlob.size === 0) {
+            addSystemMessage("Recording too short or no audio detected. Please try again.");
+            console.warn("Empty audio blob, not sending for transcription.");
+            stream.getTracks().forEach(track => track.stop()); // Stop microphone stream
+            return;
+          }
+
+          // Send to Whisper API
+          const formData = new FormData();
+          formData.append("audio", audioBlob, "recording.webm"); // Use .webm extension
+
+          addSystemMessage("Transcribing audio...");
+          try {
+            const response = await fetch("/transcribe", {
+              method: "POST",
+              body: formData
+            });
+            const data = await response.json();
+
+            if (data.text) {
+              sendMessage(data.text); // Send transcribed text to chat
+            } else if (data.error) {
+              addSystemMessage("Transcription error: " + data.error);
+              console.error("Transcription error:", data.error);
+            } else {
+              addSystemMessage("Unknown transcription response.");
+              console.error("Unknown transcription response:", data);
+            }
+          } catch (error) {
+            addSystemMessage("Network error during transcription. Please check your connection.");
+            console.error("Network error during transcription:", error);
+          }
+          // Stop microphone stream (important for privacy)
+          stream.getTracks().forEach(track => track.stop());
+        };
+
+        mediaRecorder.start();
+        isRecording = true;
+        voiceInputBtn.classList.add('recording');
+        addSystemMessage("Recording started... Say something!");
+      } catch (error) {
+        // Handle different types of microphone access errors
+        if (error.name === "NotAllowedError" || error.name === "PermissionDeniedError") {
+          addSystemMessage("Microphone access denied. Please allow microphone access in your browser settings.");
+        } else if (error.name === "NotFoundError" || error.name === "DevicesNotFoundError") {
+          addSystemMessage("No microphone found. Please ensure a microphone is connected and enabled.");
+        } else {
+          addSystemMessage("Error accessing microphone: " + error.message);
+        }
+        console.error("Microphone access error:", error);
+      }
+    } else {
+      // Stop recording
+      if (mediaRecorder && mediaRecorder.state !== 'inactive') {
+        mediaRecorder.stop();
+      }
+      isRecording = false;
+      voiceInputBtn.classList.remove('recording');
+      addSystemMessage("Recording stopped. Processing...");
+    }
+  });
+
+  // Escape key closes modals and sidebar
+  document.addEventListener('keydown', e => {
+    if (e.key === 'Escape') {
+      if (!discardConfirmModal.classList.contains('modal-hidden')) { // Check if modal is visible (doesn't have class)
+        e.preventDefault();
+        closeDiscardModal();
+      } else if (conversationSidebar.classList.contains('open')) {
+        closeSidebar();
+      }
+    }
+  });
+
+  // Click outside sidebar or modals closes them
+  document.addEventListener('click', e => {
+    if (conversationSidebar.classList.contains('open')) {
+      if (!conversationSidebar.contains(e.target) && !menuToggleBtn.contains(e.target)) {
+        closeSidebar();
+      }
+    }
+    // For discard modal
+    if (!discardConfirmModal.classList.contains('modal-hidden')) { // Check if it's visible
+      if (!discardConfirmModal.querySelector('.modal-content').contains(e.target) && e.target !== discardConfirmModal) { // Also check if target is not the modal itself
+        closeDiscardModal();
+      }
+    }
+  });
+
+  // Initial load
+  loadAndDisplayConversation(currentConversationName);
+  renderConversationList();
+  chatInput.focus();
+});
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from Core.admission import AdmissionController, ELEVATED, NORMAL, OVERLOADED
+from Core.cache import LRUCache, RedisCache
+
+
+def _lru():
+    return LRUCache()
+
+
+def _redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisCache(client=fakeredis.FakeRedis(), prefix='test')
+
+
+@pytest.fixture(params=[_lru, _redis], ids=['lru', 'redis'])
+def workers(request):
+    """Two controllers over one backend, standing in for two gunicorn workers."""
+    backend = request.param()
+    settings = dict(max_in_flight=2, max_in_flight_per_user=1, max_queue=2,
+                    queue_timeout_seconds=0.2, failure_threshold=2, cooldown_seconds=60)
+    return AdmissionController(cache=backend, **settings), AdmissionController(cache=backend, **settings)
+
+
+def test_in_flight_limit_is_shared(workers):
+    first, second = workers
+    with first.admit('a') as admitted_a, second.admit('b') as admitted_b:
+        assert admitted_a and admitted_b
+        assert first.pressure() == ELEVATED
+        with second.admit('c') as admitted_c:
+            assert not admitted_c  # queued until the deadline, no slot came free
+    assert second.pressure() == NORMAL
+    with second.admit('c') as admitted_c:
+        assert admitted_c
+
+
+def test_per_user_limit_is_shared(workers):
+    first, second = workers
+    with first.admit('a') as admitted:
+        assert admitted
+        with second.admit('a') as admitted_again:
+            assert not admitted_again
+
+
+def test_queued_request_gets_released_slot(workers):
+    first, second = workers
+    results = []
+    with first.admit('a'), first.admit('b'):
+        waiter = threading.Thread(target=lambda: results.append(second.admit('c').__enter__()))
+        waiter.start()
+        time.sleep(0.05)
+        assert second.pressure() == ELEVATED
+    waiter.join()
+    assert results == [True]
+
+
+def test_full_queue_is_overloaded(workers):
+    first, second = workers
+    with first.admit('a'), first.admit('b'):
+        for _ in range(first.max_queue):
+            assert first._take('queue', first.max_queue, 1)
+        assert second.pressure() == OVERLOADED
+
+
+def test_breaker_is_shared(workers):
+    first, second = workers
+    first.record_upstream(ok=False)
+    second.record_upstream(ok=False)
+    assert not first.upstream_available()
+    assert second.pressure() == OVERLOADED
+
+
+def test_success_resets_failures(workers):
+    first, second = workers
+    first.record_upstream(ok=False)
+    second.record_upstream(ok=True)
+    first.record_upstream(ok=False)
+    assert first.upstream_available()
+
+
+def test_voice_is_shed_under_pressure(workers):
+    first, second = workers
+    with first.voice_slot() as admitted:
+        assert admitted
+        with second.voice_slot() as admitted_again:
+            assert not admitted_again
+    with first.admit('a'), first.admit('b'):
+        with second.voice_slot() as admitted:
+            assert not admitted
+
+
+def test_lease_of_a_dead_worker_expires():
+    controller = AdmissionController(cache=LRUCache(), max_in_flight=1, queue_timeout_seconds=0.3,
+                                     upstream_timeout_seconds=0.05)
+    controller.admit('a').__enter__()  # never released, like a killed worker
+    with controller.admit('b') as admitted:
+        assert admitted
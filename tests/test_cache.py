@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from Core.cache import CacheBackend, LRUCache, NamespacedCache, RateLimiter, RedisCache, get_cache, set_cache_backend
+
+
+def _lru():
+    return LRUCache(max_entries=3)
+
+
+def _redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisCache(client=fakeredis.FakeRedis(), prefix='test')
+
+
+@pytest.fixture(params=[_lru, _redis], ids=['lru', 'redis'])
+def backend(request):
+    backend = request.param()
+    set_cache_backend(backend)
+    yield backend
+    set_cache_backend(None)
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_get_set_delete(backend):
+    assert backend.get('missing') is None
+    assert backend.get('missing', 'default') == 'default'
+    backend.set('history', [{'role': 'user', 'parts': [{'text': 'hi'}]}])
+    assert backend.get('history') == [{'role': 'user', 'parts': [{'text': 'hi'}]}]
+    backend.delete('history')
+    assert backend.get('history') is None
+
+
+def test_ttl_expires(backend):
+    backend.set('short', 'value', ttl=0.05)
+    backend.set('long', 'value', ttl=60)
+    time.sleep(0.1)
+    assert backend.get('short') is None
+    assert backend.get('long') == 'value'
+
+
+def test_incr(backend):
+    assert backend.incr('counter') == 1
+    assert backend.incr('counter', 4) == 5
+    assert backend.get('counter') == 5
+
+
+def test_incr_ttl_starts_with_first_increment(backend):
+    backend.incr('window', ttl=0.05)
+    backend.incr('window', ttl=0.05)
+    time.sleep(0.1)
+    assert backend.incr('window', ttl=0.05) == 1
+
+
+def test_add_only_sets_missing_keys(backend):
+    assert backend.add('lease', 'first', ttl=0.05)
+    assert not backend.add('lease', 'second', ttl=0.05)
+    assert backend.get('lease') == 'first'
+    time.sleep(0.1)
+    assert backend.add('lease', 'third')
+
+
+def test_get_many(backend):
+    backend.set('a', 1)
+    backend.set('c', {'x': 3})
+    assert backend.get_many(['a', 'b', 'c']) == [1, None, {'x': 3}]
+    assert get_cache('ns').get_many([]) == []
+
+
+def test_namespaces_do_not_collide(backend):
+    sessions = get_cache('sessions')
+    sentiment = get_cache('sentiment')
+    assert isinstance(sessions, NamespacedCache)
+    sessions.set('key', 'session')
+    sentiment.set('key', 'positive')
+    assert sessions.get('key') == 'session'
+    assert sentiment.get('key') == 'positive'
+
+
+def test_rate_limiter(backend):
+    limiter = RateLimiter('chat', limit=2)
+    assert limiter.allow('user')
+    assert limiter.allow('user')
+    assert not limiter.allow('user')
+    assert limiter.allow('someone-else')
+
+
+def test_lru_evicts_least_recently_used():
+    cache = _lru()
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('c', 3)
+    cache.get('a')
+    cache.set('d', 4)
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in ('a', 'c', 'd')] == [1, 3, 4]
+    assert len(cache) == 3
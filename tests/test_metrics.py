@@ -0,0 +1,37 @@
+import pytest
+
+from Core import metrics
+from Core.cache import LRUCache, RedisCache, get_cache, set_cache_backend
+
+metrics.register('test_requests_total', "Requests seen by the test.")
+metrics.register_computed('test_double', "Twice the requests.", lambda values: 2 * values['test_requests_total'])
+
+
+@pytest.fixture
+def shared_backend():
+    fakeredis = pytest.importorskip('fakeredis')
+    set_cache_backend(RedisCache(client=fakeredis.FakeRedis(), prefix='test'))
+    yield
+    set_cache_backend(None)
+
+
+def test_counters_are_shared_between_workers(shared_backend):
+    metrics.inc('test_requests_total')
+    # Another worker counting against the same Redis
+    get_cache('metrics').incr('test_requests_total', 2)
+    assert metrics.get('test_requests_total') == 3
+    assert metrics.get('test_double') == 6
+    rendered = metrics.render_prometheus()
+    assert "# TYPE test_requests_total counter\ntest_requests_total 3\n" in rendered
+    assert "test_double 6\n" in rendered
+
+
+def test_counters_stay_local_with_in_process_cache():
+    set_cache_backend(LRUCache())
+    try:
+        before = metrics.get('test_requests_total')
+        metrics.inc('test_requests_total')
+        assert metrics.get('test_requests_total') == before + 1
+        assert get_cache('metrics').get('test_requests_total') is None
+    finally:
+        set_cache_backend(None)
@@ -4,12 +4,12 @@ import logging
 import tempfile
 import traceback
 import warnings
-import whisper
 import werkzeug.datastructures
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 import secrets
 import uuid
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 
 
 import warnings
@@ -49,13 +49,33 @@ try:
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'Core')))
     
     
-    from Core.chatbot import ChatBot, guided_breathing_exercise
+    from Core.chatbot import ChatBot, UpstreamUnavailable, guided_breathing_exercise, handle_crisis_message
     from Core.utils import load_config
     from Core.memory import save_conversation, load_conversation, list_conversations, delete_conversation
+    from Core.retention import start_retention_job
+    from Core.sharding import check_layout
+    from Core.transfer import iter_records, iter_ndjson, iter_lines, import_records, LineTooLong
+    from Core.cache import RateLimiter
+    from Core.admission import AdmissionController, get_admission_config, NORMAL
+    from Core.transcription import transcribe_file, preload as preload_transcription
+    from Core import assets, profiling, metrics
     
     app = Flask(__name__)
     app.secret_key = os.getenv('FLASK_SECRET_KEY', secrets.token_urlsafe(16))
+    if not os.getenv('FLASK_SECRET_KEY'):
+        logger.warning("FLASK_SECRET_KEY is not set; sessions will not be shared across workers or restarts.")
     config = load_config()
+    # Bounds uploads and /import bodies; request.stream raises RequestEntityTooLarge past it
+    app.config['MAX_CONTENT_LENGTH'] = config.get('max_request_mb', 32) * 1024 * 1024
+    assets.init_app(app)
+    profiling.init_app(app)
+
+    rate_limits = config.get('rate_limits', {})
+    chat_rate_limiter = RateLimiter('chat', rate_limits.get('chat_per_minute', 30))
+    transcribe_rate_limiter = RateLimiter('transcribe', rate_limits.get('transcribe_per_minute', 10))
+
+    admission_config = get_admission_config()
+    admission = AdmissionController(**admission_config)
 
     # Load environment variables from .env file explicitly
     load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
@@ -64,6 +84,10 @@ try:
     chatbot_instance = ChatBot(chat_model_name="gemini-1.5-flash", title_model_name="gemini-1.5-flash")
     logger.info("ChatBot initialized successfully")
 
+    check_layout()
+    start_retention_job()
+    preload_transcription()
+
     @app.route('/')
     def index():
         return render_template('index.html')
@@ -81,12 +105,25 @@ try:
             if not data or 'message' not in data:
                 return jsonify({'error': 'No message provided'}), 400
 
+            user_message = data['message']
+
+            # Crisis messages are answered locally and are never rate limited or shed
+            crisis_response = handle_crisis_message(user_message)
+
+            if not crisis_response and not chat_rate_limiter.allow(user_id):
+                logger.warning(f"Chat rate limit exceeded for user '{user_id}'")
+                return jsonify({
+                    'error': 'Rate limit exceeded',
+                    'response': "You're sending messages very quickly. Let's take a breath and try again in a moment.",
+                    'history': data.get('history', []),
+                    'user_profile': data.get('user_profile', {}),
+                    'conversation_name': data.get('conversation_name', 'default')
+                }), 429
+
             # Original conversation_name from frontend
             frontend_conversation_name = data.get('conversation_name', 'default')
             # Prefix conversation_name with user_id for isolation
             conversation_name_with_prefix = f"{user_id}_{frontend_conversation_name}"
-
-            user_message = data['message']
             
             # Get history and user profile from frontend
             current_conversation_history = data.get('history', [])
@@ -99,24 +136,17 @@ try:
                 'current_language': data.get('language', config.get('default_language', 'en'))
             }
             
-            # Generate new title for default conversations with empty history
-            if frontend_conversation_name == 'default' and not current_conversation_history:
-                logger.debug("Generating new conversation title")
-                
-                # Create temporary history for title generation
-                title_generation_history = [{'role': 'user', 'parts': [{'text': user_message}]}]
-                generated_title = chatbot_instance.generate_conversation_title(
-                    title_generation_history,
-                    response_config
-                )
-                # Prefix the generated title as well
-                conversation_name_with_prefix = f"{user_id}_{generated_title}"
+            # Generate new title for default conversations with empty history (skipped under pressure)
+            generated_title = None
+            if (frontend_conversation_name == 'default' and not current_conversation_history
+                    and not crisis_response and admission.pressure() == NORMAL):
+                generated_title = _generate_title(user_id, user_message, response_config)
+
+            if generated_title:
+                # Cached titles repeat for similar openers, so never reuse an existing conversation's name
+                conversation_name_with_prefix = f"{user_id}_{_unused_conversation_name(user_id, generated_title)}"
                 logger.debug(f"Generated prefixed title: '{conversation_name_with_prefix}'")
-                
-                # Load existing history for this conversation name
-                loaded_history, loaded_profile = load_conversation(conversation_name_with_prefix)
-                current_conversation_history = loaded_history
-                current_user_profile = loaded_profile if not current_user_profile else current_user_profile
+                current_conversation_history = []
             else:
                 # Load existing conversation with the prefixed name
                 current_conversation_history, current_user_profile = load_conversation(conversation_name_with_prefix)
@@ -125,7 +155,27 @@ try:
             current_conversation_history.append({'role': 'user', 'parts': [{'text': user_message}]})
 
             # Get bot response
-            bot_response_text = chatbot_instance.get_response(user_message)
+            if crisis_response:
+                bot_response_text = crisis_response
+            else:
+                with admission.admit(user_id) as admitted:
+                    if admitted and admission.upstream_available():
+                        try:
+                            bot_response_text = chatbot_instance.get_response(
+                                user_message,
+                                session_key=conversation_name_with_prefix,
+                                timeout=admission_config['upstream_timeout_seconds'],
+                                raise_upstream_errors=True,
+                                # Everything before the message just appended
+                                history=current_conversation_history[:-1]
+                            )
+                            admission.record_upstream(ok=True)
+                        except UpstreamUnavailable:
+                            admission.record_upstream(ok=False)
+                            bot_response_text = chatbot_instance.get_fallback_response(user_message)
+                    else:
+                        logger.info(f"Degraded response for user '{user_id}' (pressure level {admission.pressure()})")
+                        bot_response_text = chatbot_instance.get_fallback_response(user_message)
             logger.debug(f"Bot response: {bot_response_text}")
             
             # Update history with bot response
@@ -150,64 +200,99 @@ try:
                 'response': f"I encountered an error: {str(e)}"
             }), 500
 
+    def _unused_conversation_name(user_id, title):
+        existing = set(list_conversations(user_id))
+        name = title
+        suffix = 2
+        while name in existing:
+            name = f"{title} ({suffix})"
+            suffix += 1
+        return name
+
+    def _generate_title(user_id, user_message, response_config):
+        """Title the first message of a new chat; the Gemini call takes an admission slot like any other."""
+        with admission.admit(user_id) as admitted:
+            if not admitted or not admission.upstream_available():
+                return None
+            logger.debug("Generating new conversation title")
+            # Create temporary history for title generation
+            title_generation_history = [{'role': 'user', 'parts': [{'text': user_message}]}]
+            try:
+                generated_title = chatbot_instance.generate_conversation_title(
+                    title_generation_history,
+                    response_config,
+                    timeout=admission_config['upstream_timeout_seconds'],
+                    raise_upstream_errors=True
+                )
+                admission.record_upstream(ok=True)
+                return generated_title
+            except UpstreamUnavailable:
+                admission.record_upstream(ok=False)
+                return None
+
     @app.route("/transcribe", methods=["POST"])
     def transcribe():
         try:
             logger.debug("Transcribe endpoint called")
+
+            if not transcribe_rate_limiter.allow(session.get('user_id', request.remote_addr)):
+                logger.warning("Transcribe rate limit exceeded")
+                return jsonify({"error": "Too many voice messages, please wait a moment"}), 429
+
+            with admission.voice_slot() as admitted:
+                if not admitted:
+                    logger.warning("Transcription shed: server under pressure")
+                    return jsonify({"error": "Voice input is busy right now, please type your message instead"}), 503, {'Retry-After': '10'}
+                return _transcribe_request()
+        except Exception as e:
+            logger.error(f"Transcribe endpoint error: {str(e)}", exc_info=True)
+            return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+    def _transcribe_request():
+        if 'audio' not in request.files:
+            logger.error("No audio file in request")
+            return jsonify({"error": "No audio file provided"}), 400
+        
+        audio_file = request.files['audio']
+        
+       
+        if not audio_file or audio_file.filename == '':
+            logger.error("Empty audio file")
+            return jsonify({"error": "No audio file selected"}), 400
+        
+        logger.debug(f"Audio file received: {audio_file.filename}")
+        
+        temp_audio_path = None
+        try:
             
-            
-            if 'audio' not in request.files:
-                logger.error("No audio file in request")
-                return jsonify({"error": "No audio file provided"}), 400
-            
-            audio_file = request.files['audio']
-            
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_audio:
+                audio_file.save(tmp_audio.name)
+                temp_audio_path = tmp_audio.name
+                logger.debug(f"Audio saved to: {temp_audio_path}")
+
            
-            if not audio_file or audio_file.filename == '':
-                logger.error("Empty audio file")
-                return jsonify({"error": "No audio file selected"}), 400
+            if not os.path.exists(temp_audio_path) or os.path.getsize(temp_audio_path) == 0:
+                logger.error("Audio file is empty or doesn't exist")
+                return jsonify({"error": "Audio file is empty"}), 400
+
+          
+            logger.debug("Transcribing audio...")
+            transcribed_text = transcribe_file(temp_audio_path)
+            logger.debug(f"Transcription result: {transcribed_text}")
             
-            logger.debug(f"Audio file received: {audio_file.filename}")
+            return jsonify({"text": transcribed_text})
             
-            temp_audio_path = None
-            try:
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_audio:
-                    audio_file.save(tmp_audio.name)
-                    temp_audio_path = tmp_audio.name
-                    logger.debug(f"Audio saved to: {temp_audio_path}")
-
-               
-                if not os.path.exists(temp_audio_path) or os.path.getsize(temp_audio_path) == 0:
-                    logger.error("Audio file is empty or doesn't exist")
-                    return jsonify({"error": "Audio file is empty"}), 400
-
-              
-                logger.debug("Loading Whisper model...")
-                model = whisper.load_model("base")
-                logger.debug("Transcribing audio...")
-                result = model.transcribe(temp_audio_path)
-                
-                transcribed_text = result["text"]
-                logger.debug(f"Transcription result: {transcribed_text}")
-                
-                return jsonify({"text": transcribed_text})
-                
-            except Exception as e:
-                logger.error(f"Transcription processing error: {str(e)}", exc_info=True)
-                return jsonify({"error": f"Transcription failed: {str(e)}"}), 500
-            finally:
-                
-                if temp_audio_path and os.path.exists(temp_audio_path):
-                    try:
-                        os.remove(temp_audio_path)
-                        logger.debug("Temporary audio file cleaned up")
-                    except Exception as e:
-                        logger.warning(f"Failed to clean up temp file: {e}")
-                        
         except Exception as e:
-            logger.error(f"Transcribe endpoint error: {str(e)}", exc_info=True)
-            return jsonify({"error": f"Server error: {str(e)}"}), 500
+            logger.error(f"Transcription processing error: {str(e)}", exc_info=True)
+            return jsonify({"error": f"Transcription failed: {str(e)}"}), 500
+        finally:
+            
+            if temp_audio_path and os.path.exists(temp_audio_path):
+                try:
+                    os.remove(temp_audio_path)
+                    logger.debug("Temporary audio file cleaned up")
+                except Exception as e:
+                    logger.warning(f"Failed to clean up temp file: {e}")
 
     @app.route('/breathing_exercise', methods=['POST'])
     def breathing_exercise():
@@ -307,6 +392,8 @@ try:
             logger.debug(f"Deleting conversation: '{frontend_conversation_name}' for user '{user_id}'")
             
             delete_conversation(user_id, frontend_conversation_name)
+            # A new conversation with the same name must not inherit the deleted one's context
+            chatbot_instance.end_session(f"{user_id}_{frontend_conversation_name}")
             logger.info(f"Successfully deleted conversation: '{frontend_conversation_name}' for user '{user_id}'")
             return jsonify({
                 'success': True, 
@@ -319,6 +406,45 @@ try:
                 'message': f'Failed to delete: {str(e)}'
             }), 500
 
+    @app.route('/export', methods=['GET'])
+    def export_data():
+        try:
+            if 'user_id' not in session:
+                return jsonify({'success': False, 'message': 'No user session found'}), 401
+            user_id = session['user_id']
+            compress = request.args.get('gzip', '0') == '1'
+
+            file_name = 'moa-export.ndjson.gz' if compress else 'moa-export.ndjson'
+            return Response(
+                stream_with_context(iter_ndjson(iter_records(user_id), compress=compress)),
+                mimetype='application/gzip' if compress else 'application/x-ndjson',
+                headers={'Content-Disposition': f'attachment; filename="{file_name}"'}
+            )
+        except Exception as e:
+            logger.error(f"Export error: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'message': f'Failed to export: {str(e)}'}), 500
+
+    @app.route('/import', methods=['POST'])
+    def import_data():
+        try:
+            if 'user_id' not in session:
+                return jsonify({'success': False, 'message': 'No user session found'}), 401
+            user_id = session['user_id']
+
+            # Records are always imported into the caller's own account
+            counts = import_records(iter_lines(request.stream.read), user_id=user_id)
+            return jsonify({'success': True, 'imported': counts})
+        except (LineTooLong, RequestEntityTooLarge) as e:
+            logger.warning(f"Import rejected: {e}")
+            return jsonify({'success': False, 'message': 'Import file is too large'}), 413
+        except Exception as e:
+            logger.error(f"Import error: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'message': f'Failed to import: {str(e)}'}), 500
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
     @app.errorhandler(404)
     def page_not_found(e):
         return jsonify({'error': 'Not found'}), 404